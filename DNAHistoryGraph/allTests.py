@@ -8,13 +8,15 @@ import unittest
 from pyAVG.DNAHistoryGraph.graphTest import DNAHistoryGraphTest
 from pyAVG.DNAHistoryGraph.segmentTest import SegmentTest
 from pyAVG.DNAHistoryGraph.sideTest import SideTest
+from pyAVG.DNAHistoryGraph.extensionTest import ExtensionTest
 
 from cactus.shared.test import parseCactusSuiteTestOptions
 
 def allSuites(): 
     allTests = unittest.TestSuite((unittest.makeSuite(DNAHistoryGraphTest, 'test'),
                                    unittest.makeSuite(SegmentTest, 'test'),
-                                   unittest.makeSuite(SideTest, 'test')))
+                                   unittest.makeSuite(SideTest, 'test'),
+                                   unittest.makeSuite(ExtensionTest, 'test')))
     return allTests
         
 def main():
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+class AmbiguityCounter(object):
+	"""
+	Running totals of the substitution and rearrangement ambiguities of a graph.
+	The non-zero contribution of each segment and side is cached, and only the contributions of the lineages
+	dirtied by a mutation (see DNAHistoryGraph._lineages) are recomputed.
+	"""
+	def __init__(self, graph):
+		self.graph = graph
+		self.reset()
+
+	def reset(self):
+		""" Recomputes all contributions from scratch """
+		self.segments = dict()
+		self.sides = dict()
+		self.substitutionAmbiguity = 0
+		self.rearrangementAmbiguity = 0
+		self.update(self.graph.segments, self.graph.sides())
+
+	def update(self, segments, sides):
+		""" Recomputes the contributions of the given segments and sides """
+		for segment in segments:
+			ambiguity = segment.substitutionAmbiguity()
+			self.substitutionAmbiguity += ambiguity - self.segments.pop(segment, 0)
+			if ambiguity > 0:
+				self.segments[segment] = ambiguity
+		for side in sides:
+			ambiguity = side.rearrangementAmbiguity()
+			self.rearrangementAmbiguity += ambiguity - self.sides.pop(side, 0)
+			if ambiguity > 0:
+				self.sides[side] = ambiguity
+
+	def validate(self, segments=None, sides=None):
+		""" Checks the contributions of the given segments and sides, or recomputes all of them and the totals by default """
+		if segments is None or sides is None:
+			assert all(X in self.graph.segments for X in self.segments)
+			assert all(X.segment in self.graph.segments for X in self.sides)
+			assert self.substitutionAmbiguity == sum(self.segments.values())
+			assert self.rearrangementAmbiguity == sum(self.sides.values())
+			segments = self.graph.segments
+			sides = self.graph.sides()
+		assert all(self.segments.get(X, 0) == X.substitutionAmbiguity() for X in segments)
+		assert all(self.sides.get(X, 0) == X.rearrangementAmbiguity() for X in sides)
+		return True
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+from module import moduleLinks
+from modulePartition import ModulePartition
+
+class BoundTracker(object):
+	"""
+	Running totals of the cost bounds of a graph.
+	Substitution bounds are cached per segment, rearrangement bounds per module of a ModulePartition, and only the segments
+	and the modules of the sides dirtied by a mutation (see DNAHistoryGraph._lineages) are recomputed.
+	"""
+	def __init__(self, graph):
+		self.graph = graph
+		self.reset()
+
+	def reset(self):
+		""" Recomputes all contributions from scratch """
+		self.segments = dict()
+		self.partition = ModulePartition()
+		# Bounds of each module when last counted, as its sides may have changed since
+		self.moduleBounds = dict()
+		self.lowerBoundSubstitutionCost = 0
+		self.upperBoundSubstitutionCost = 0
+		self.lowerBoundRearrangementCost = 0
+		self.upperBoundRearrangementCost = 0
+		self.update(self.graph.segments, self.graph.sides())
+
+	def update(self, segments, sides):
+		""" Recomputes the bounds of the given segments and of the modules of the given sides """
+		for segment in segments:
+			lower, upper = self.segments.pop(segment, (0, 0))
+			self.lowerBoundSubstitutionCost -= lower
+			self.upperBoundSubstitutionCost -= upper
+			lower = segment.lowerBoundSubstitutionCost()
+			upper = segment.upperBoundSubstitutionCost()
+			self.lowerBoundSubstitutionCost += lower
+			self.upperBoundSubstitutionCost += upper
+			if lower != 0 or upper != 0:
+				self.segments[segment] = (lower, upper)
+
+		retired, modules = self.partition.update(sides)
+		for module in retired:
+			lower, upper = self.moduleBounds.pop(module, (0, 0))
+			self.lowerBoundRearrangementCost -= lower
+			self.upperBoundRearrangementCost -= upper
+		for module in modules:
+			lower = module.lowerBoundRearrangementCost()
+			upper = module.upperBoundRearrangementCost()
+			self.moduleBounds[module] = (lower, upper)
+			self.lowerBoundRearrangementCost += lower
+			self.upperBoundRearrangementCost += upper
+
+	def validate(self, segments=None, sides=None):
+		""" Checks the contributions of the given segments and of the modules of the given sides, or rebuilds all the modules and totals by default """
+		if segments is not None and sides is not None:
+			assert all(self.segments.get(X, (0, 0)) == (X.lowerBoundSubstitutionCost(), X.upperBoundSubstitutionCost()) for X in segments)
+			assert all((X in self.partition.links) == X.isModuleMaterial() for X in sides)
+			modules = set(self.partition.module(X) for X in sides if X in self.partition.links)
+			assert all(self.partition.links[X] == moduleLinks(X) for Y in modules for X in Y.sides)
+			assert all(self.moduleBounds[X] == (X.lowerBoundRearrangementCost(), X.upperBoundRearrangementCost()) for X in modules)
+			return True
+		assert all(X in self.graph.segments for X in self.segments)
+		assert all(self.segments.get(X, (0, 0)) == (X.lowerBoundSubstitutionCost(), X.upperBoundSubstitutionCost()) for X in self.graph.segments)
+		assert self.lowerBoundSubstitutionCost == sum(X[0] for X in self.segments.values())
+		assert self.upperBoundSubstitutionCost == sum(X[1] for X in self.segments.values())
+		modules = self.graph._computeModules()
+		assert self.partition.validate(modules)
+		assert set(self.moduleBounds) == set(self.partition)
+		assert all(self.moduleBounds[X] == (X.lowerBoundRearrangementCost(), X.upperBoundRearrangementCost()) for X in self.partition)
+		assert self.lowerBoundRearrangementCost == sum(X.lowerBoundRearrangementCost() for X in modules)
+		assert self.upperBoundRearrangementCost == sum(X.upperBoundRearrangementCost() for X in modules)
+		return True
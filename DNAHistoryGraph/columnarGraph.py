@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+import math
+from array import array
+
+class ColumnarGraph(object):
+	"""
+	Frozen struct-of-arrays copy of a DNAHistoryGraph, for read-only analytics over finished graphs.
+	Segments are numbered 0 to n-1 in the iteration order of the graph, and side 2i (resp. 2i+1) is the left (resp. right) side of segment i.
+	Ambiguities and cost bounds are computed by whole-array passes in breadth first order, and match those of the object model.
+	The passes are plain Python loops over array.array columns, so they save memory and object traversals but are not vectorised.
+	Lifting ancestors, lifted labels and lifted bonds are answered from the columns too, by segment or side number.
+	"""
+	def __init__(self, graph):
+		segments = list(graph.segments)
+		index = dict((X, i) for i, X in enumerate(segments))
+		self.size = len(segments)
+		# Label codes, -1 for unlabeled segments, indexing the alphabet
+		self.alphabet = "ACGT"
+		self.labels = array('b', [-1] * self.size)
+		self.parents = array('l', [-1] * self.size)
+		self.bonds = array('l', [-1] * (2 * self.size))
+		self.threads = array('l', [-1] * self.size)
+		threadIDs = dict()
+		for i, segment in enumerate(segments):
+			if segment.label is not None:
+				code = self.alphabet.find(str(segment.label))
+				if code < 0:
+					code = len(self.alphabet)
+					self.alphabet += str(segment.label)
+				self.labels[i] = code
+			if segment.parent is not None:
+				self.parents[i] = index[segment.parent]
+			for side in segment.sides():
+				if side.bond is not None:
+					self.bonds[2 * i + (not side.left)] = 2 * index[side.bond.segment] + (not side.bond.left)
+			self.threads[i] = threadIDs.setdefault(graph.segmentThreads[segment], len(threadIDs))
+
+		# Children in compressed sparse rows, segment i owning childIndex[childStart[i]:childStart[i + 1]]
+		self.childStart = array('l', [0] * (self.size + 1))
+		for parent in self.parents:
+			if parent >= 0:
+				self.childStart[parent + 1] += 1
+		for i in range(self.size):
+			self.childStart[i + 1] += self.childStart[i]
+		self.childIndex = array('l', [0] * self.childStart[self.size])
+		fill = array('l', self.childStart[:self.size])
+		for i, parent in enumerate(self.parents):
+			if parent >= 0:
+				self.childIndex[fill[parent]] = i
+				fill[parent] += 1
+
+		# Breadth first order, parents before children
+		self.order = array('l', [i for i in range(self.size) if self.parents[i] < 0])
+		position = 0
+		while position < len(self.order):
+			i = self.order[position]
+			self.order.extend(self.childIndex[self.childStart[i]:self.childStart[i + 1]])
+			position += 1
+
+		self._computeSubstitutions()
+		self._computeRearrangements()
+
+	def children(self, i):
+		return self.childIndex[self.childStart[i]:self.childStart[i + 1]]
+
+	def sideParent(self, side):
+		parent = self.parents[side >> 1]
+		if parent < 0:
+			return -1
+		return 2 * parent + (side & 1)
+
+	def sideChildren(self, side):
+		return [2 * X + (side & 1) for X in self.children(side >> 1)]
+
+	##################################
+	## Lifted labels
+	##################################
+	def _computeSubstitutions(self):
+		# Lifting ancestor of each segment, and closest labeled or root ancestor of each segment including itself
+		self.labelAncestors = array('l', [-1] * self.size)
+		lifted = array('l', [-1] * self.size)
+		for i in self.order:
+			parent = self.parents[i]
+			if parent < 0:
+				self.labelAncestors[i] = i
+				lifted[i] = i
+			else:
+				self.labelAncestors[i] = lifted[parent]
+				lifted[i] = i if self.labels[i] >= 0 else lifted[parent]
+
+		# Number of lifted labels of each segment, per label code
+		width = len(self.alphabet)
+		counts = array('l', [0] * (self.size * width))
+		for i in range(self.size):
+			if self.labels[i] >= 0 and self.parents[i] >= 0:
+				counts[self.labelAncestors[i] * width + self.labels[i]] += 1
+
+		self._substitutionAmbiguity = 0
+		self._lowerBoundSubstitutionCost = 0
+		self._upperBoundSubstitutionCost = 0
+		for i in range(self.size):
+			label = self.labels[i]
+			if label < 0 and self.parents[i] >= 0:
+				continue
+			nonTrivial = [counts[i * width + X] for X in range(width) if X != label]
+			total = sum(nonTrivial)
+			self._substitutionAmbiguity += max(0, total - 1)
+			self._lowerBoundSubstitutionCost += max(0, sum(X > 0 for X in nonTrivial) - (label < 0))
+			if label < 0 and total > 0:
+				self._upperBoundSubstitutionCost += total - max(nonTrivial)
+			else:
+				self._upperBoundSubstitutionCost += total
+
+	##################################
+	## Lifted bonds and modules
+	##################################
+	def _computeRearrangements(self):
+		sideNumber = 2 * self.size
+		sideOrder = [2 * i + X for i in self.order for X in (0, 1)]
+
+		# Lifting ancestors, as for labels
+		self.bondAncestors = array('l', [-1] * sideNumber)
+		lifted = array('l', [-1] * sideNumber)
+		for side in sideOrder:
+			parent = self.sideParent(side)
+			if parent < 0:
+				self.bondAncestors[side] = side
+				lifted[side] = side
+			else:
+				self.bondAncestors[side] = lifted[parent]
+				lifted[side] = side if self.bonds[side] >= 0 else lifted[parent]
+
+		# Attached descent and junctions, children before parents
+		attached = array('b', [X >= 0 for X in self.bonds])
+		attachedChildren = array('l', [0] * sideNumber)
+		for side in reversed(sideOrder):
+			parent = self.sideParent(side)
+			if parent >= 0 and attached[side]:
+				attached[parent] = True
+				attachedChildren[parent] += 1
+
+		# Whether an unattached junction lies strictly between each side and its lifting ancestor
+		self.junctionBelow = junctionBelow = array('b', [False] * sideNumber)
+		for side in sideOrder:
+			parent = self.sideParent(side)
+			if parent >= 0 and self.bonds[parent] < 0 and self.sideParent(parent) >= 0:
+				junctionBelow[side] = attachedChildren[parent] >= 2 or junctionBelow[parent]
+
+		# Non trivial lifted bonds, free root partners and module links of each lifting ancestor
+		self.liftedBondNumbers = array('l', [0] * sideNumber)
+		self.nonTrivialLiftedBondNumbers = array('l', [0] * sideNumber)
+		freeRoots = array('l', [0] * sideNumber)
+		links = []
+		for side in range(sideNumber):
+			partner = self.bonds[side]
+			if partner < 0:
+				continue
+			links.append((side, partner))
+			if self.sideParent(side) < 0:
+				continue
+			ancestor = self.bondAncestors[side]
+			self.liftedBondNumbers[ancestor] += 1
+			if self.bondAncestors[partner] != self.bonds[ancestor] or junctionBelow[side] or junctionBelow[partner]:
+				self.nonTrivialLiftedBondNumbers[ancestor] += 1
+				if self.bondAncestors[partner] == partner:
+					freeRoots[ancestor] += 1
+				else:
+					links.append((ancestor, self.bondAncestors[partner]))
+
+		self._rearrangementAmbiguity = 0
+		for side in range(sideNumber):
+			if self.bonds[side] >= 0 or self.sideParent(side) < 0:
+				self._rearrangementAmbiguity += max(0, self.nonTrivialLiftedBondNumbers[side] - 1)
+
+		# Modules are the connected components of the module sides
+		roots = array('l', range(sideNumber))
+		def find(side):
+			while roots[side] != side:
+				roots[side] = roots[roots[side]]
+				side = roots[side]
+			return side
+		for sideA, sideB in links:
+			rootA = find(sideA)
+			rootB = find(sideB)
+			if rootA != rootB:
+				roots[rootB] = rootA
+		self.modules = array('l', [-1] * sideNumber)
+		moduleIDs = dict()
+		counts = []
+		for side in range(sideNumber):
+			if self.bonds[side] >= 0 or (self.sideParent(side) < 0 and self.liftedBondNumbers[side] > 0):
+				root = find(side)
+				if root not in moduleIDs:
+					moduleIDs[root] = len(counts)
+					counts.append([0, 0, 0, 0])
+				self.modules[side] = moduleIDs[root]
+				liftedBonds = self.nonTrivialLiftedBondNumbers[side]
+				count = counts[moduleIDs[root]]
+				count[0] += 1
+				count[1] += freeRoots[side]
+				count[2] += liftedBonds
+				count[3] += liftedBonds != 1
+
+		self._lowerBoundRearrangementCost = 0
+		self._upperBoundRearrangementCost = 0
+		for sides, freeRootNumber, liftedBondNumber, nonUnitNumber in counts:
+			self._lowerBoundRearrangementCost += math.ceil((freeRootNumber + sides)/2.0) - 1
+			self._upperBoundRearrangementCost += (liftedBondNumber + freeRootNumber)/2 - (nonUnitNumber == 0)
+		self.moduleNumber = len(counts)
+
+	##################################
+	## Lifting queries
+	##################################
+	def ancestor(self, i):
+		""" Returns the closest labeled strict ancestor of segment i, or its root, as Segment.ancestor() """
+		return self.labelAncestors[i]
+
+	def liftedLabels(self, i):
+		""" Returns the set of the labeled segments reached from segment i through unlabeled descendants, as Segment.liftedLabels() """
+		lifted = set()
+		todo = list(self.children(i))
+		while len(todo) > 0:
+			j = todo.pop()
+			if self.labels[j] >= 0:
+				lifted.add(j)
+			else:
+				todo.extend(self.children(j))
+		return lifted
+
+	def nonTrivialLiftedLabels(self, i):
+		""" As Segment.nonTrivialLiftedLabels() """
+		return set(X for X in self.liftedLabels(i) if self.labels[X] != self.labels[i])
+
+	def sideAncestor(self, side):
+		""" Returns the closest bonded strict ancestor of a side, or its root, as Side.ancestor() """
+		return self.bondAncestors[side]
+
+	def liftedBonds(self, side):
+		""" Returns the set of the bonded sides reached from a side through unbonded descendants, as Side.liftedBonds() """
+		lifted = set()
+		todo = self.sideChildren(side)
+		while len(todo) > 0:
+			descendant = todo.pop()
+			if self.bonds[descendant] >= 0:
+				lifted.add(descendant)
+			else:
+				todo.extend(self.sideChildren(descendant))
+		return lifted
+
+	def nonTrivialLiftedBonds(self, side):
+		""" As Side.nonTrivialLiftedBonds() """
+		return set(X for X in self.liftedBonds(side) if self.bondAncestors[self.bonds[X]] != self.bonds[side]
+				or self.junctionBelow[X] or self.junctionBelow[self.bonds[X]])
+
+	##################################
+	## Queries
+	##################################
+	def substitutionAmbiguity(self):
+		return self._substitutionAmbiguity
+
+	def rearrangementAmbiguity(self):
+		return self._rearrangementAmbiguity
+
+	def ambiguity(self):
+		return self.substitutionAmbiguity() + self.rearrangementAmbiguity()
+
+	def isAVG(self):
+		return self.ambiguity() == 0
+
+	def lowerBoundSubstitutionCost(self):
+		return self._lowerBoundSubstitutionCost
+
+	def upperBoundSubstitutionCost(self):
+		return self._upperBoundSubstitutionCost
+
+	def lowerBoundRearrangementCost(self):
+		return self._lowerBoundRearrangementCost
+
+	def upperBoundRearrangementCost(self):
+		return self._upperBoundRearrangementCost
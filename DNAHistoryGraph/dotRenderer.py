@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+def _arrow(side):
+	if side.left:
+		return "normal"
+	return "inv"
+
+_labelColours = { 'A':"greenyellow", 'C':'rosybrown', 'G':"powderblue", 'T':"plum" }
+
+class DotRenderer(object):
+	"""
+	Writes the GraphViz output of threads, segments and sides to a file object line by line, memoizing the lifting information
+	shared between segments and sides, so that rendering a graph takes linear time. Their dot() methods go through it too.
+	"""
+	def __init__(self, file):
+		self.file = file
+		self.started = False
+		# Labels found among the lifted labels of unlabeled segments
+		self.labelStrings = dict()
+		# Whether an unattached junction lies between a side and its lifting ancestor, the side included
+		self.junctions = dict()
+
+	def line(self, text):
+		""" Writes a line, lines being separated rather than terminated by newlines as with str.join """
+		if self.started:
+			self.file.write("\n")
+		self.file.write(text)
+		self.started = True
+
+	##################################
+	## Lifting information
+	##################################
+	def _liftedLabelStrings(self, segment):
+		""" Returns the frozenset of the labels of the lifted labels of an unlabeled segment """
+		todo = [segment]
+		while len(todo) > 0:
+			current = todo[-1]
+			if current in self.labelStrings:
+				todo.pop()
+				continue
+			pending = [X for X in current.children if X.label is None and X not in self.labelStrings]
+			if len(pending) > 0:
+				todo.extend(pending)
+				continue
+			strings = set()
+			for child in current.children:
+				if child.label is not None:
+					strings.add(str(child.label))
+				else:
+					strings |= self.labelStrings[child]
+			self.labelStrings[current] = frozenset(strings)
+			todo.pop()
+		return self.labelStrings[segment]
+
+	def _junctionsOnTheWay(self, side):
+		""" Memoized side._junctionsOnTheWay() """
+		ancestor = side.ancestor()
+		path = []
+		parent = side.parent()
+		found = False
+		while parent is not None and parent is not ancestor:
+			if parent in self.junctions:
+				found = self.junctions[parent]
+				break
+			path.append(parent)
+			if parent.isJunction():
+				found = True
+				break
+			parent = parent.parent()
+		# The sides of the path share the lifting ancestor of side, and none of them is a junction but maybe the last
+		for X in path:
+			self.junctions[X] = found
+		return found
+
+	##################################
+	## Output
+	##################################
+	def thread(self, thread):
+		""" Writes thread.dot() """
+		traversals = thread.traversals
+		self.line(" ".join(["{rank = same;"] + [str(id(X.segment)) for X in traversals] + ["}"]))
+		for traversal in traversals:
+			self.segment(traversal.segment)
+
+	def segment(self, segment):
+		""" Writes segment.dot() """
+		parent = segment.parent
+		if segment.label is not None:
+			labelColour = _labelColours[str(segment.label)]
+		else:
+			labelColour = "white"
+		colour = "black"
+		if parent is None:
+			colour = "grey"
+		lines = ['%i [label="", style=filled, fillcolor=%s, width=0.25, height=0.25, color=%s, fixedsize=true]' % (id(segment), labelColour, colour)]
+		if parent is not None:
+			ancestor = segment.ancestor()
+			if segment.label is not None:
+				trivial = ancestor.label == segment.label
+			else:
+				# Lifted labels of segment are lifted labels of its ancestor, non trivial unless they match its label
+				strings = self._liftedLabelStrings(segment)
+				if ancestor.label is None:
+					trivial = len(strings) == 0
+				else:
+					trivial = strings <= set([str(ancestor.label)])
+			if trivial:
+				lines.append('%i -> %i [color=green, weight=1000]' % (id(parent), id(segment)))
+			elif parent.parent is None:
+				lines.append('%i -> %i [color=lightblue, weight=1000]' % (id(parent), id(segment)))
+			else:
+				lines.append('%i -> %i [color=blue, weight=1000]' % (id(parent), id(segment)))
+		lines.append(self._side(segment.left))
+		if segment.left.bond is not segment.right:
+			lines.append(self._side(segment.right))
+		self.line("\n".join(lines))
+
+	def side(self, side):
+		""" Writes side.dot() """
+		self.line(self._side(side))
+
+	def _side(self, side):
+		""" Returns side.dot() """
+		# Sides are ordered by id(), see Side.__cmp__
+		l = []
+		bond = side.bond
+		if bond is not None:
+			if id(side) <= id(bond):
+				l.append("%i -> %i [color=red, dir=both, arrowtail=%s, arrowhead=%s]" % (id(side.segment), id(bond.segment), _arrow(side), _arrow(bond)))
+		if bond is not None or side.segment.parent is None:
+			# Lifted bonds of module material sides, see Side.isModuleMaterial()
+			for descendant in side._liftedBonds():
+				linkedAncestor = descendant.bond.ancestor()
+				# Only non trivial lifted bonds are drawn
+				if id(side) < id(linkedAncestor) and (linkedAncestor is not bond or self._junctionsOnTheWay(descendant) or self._junctionsOnTheWay(descendant.bond)):
+					l.append("%i -> %i [color=magenta, dir=both, arrowtail=%s, arrowhead=%s, weight=0]" % (id(side.segment), id(linkedAncestor.segment), _arrow(side), _arrow(linkedAncestor)))
+		return "\n".join(l)
@@ -1,4 +1,5 @@
 from graph import DNAHistoryGraph
+from dotRenderer import DotRenderer
 
 def _layerRanks(layer):
 	return " ".join(["{rank=same;"] + [str(id(T.segment)) for Th in layer for T in Th] + ["}"])
@@ -8,6 +9,11 @@ class EvolutionaryHistory(DNAHistoryGraph):
 		self.layers = layers
 		super(EvolutionaryHistory, self).__init__(traversal.segment for layer in layers for thread in layer for traversal in thread)
 
-	def dot(self):
-		ranks = map(_layerRanks, self.layers)
-		return "\n".join(["digraph G {"] + ranks + [X.dot() for X in self.segments] + ["}"])
+	def writeDot(self, file):
+		renderer = DotRenderer(file)
+		renderer.line("digraph G {")
+		for layer in self.layers:
+			renderer.line(_layerRanks(layer))
+		for segment in self.segments:
+			renderer.segment(segment)
+		renderer.line("}")
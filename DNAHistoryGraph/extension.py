@@ -2,6 +2,7 @@
 
 import copy
 from graph import DNAHistoryGraph
+from dotRenderer import DotRenderer
 from label import Label
 
 class GraphExtension(DNAHistoryGraph):
@@ -14,7 +15,7 @@ class GraphExtension(DNAHistoryGraph):
 				duplicates[segment].right.createBond(duplicates[segment.right.bond.segment].getSide(segment.right.bond.left))
 			if segment.parent is not None and duplicates[segment].parent is None:
 				duplicates[segment.parent].createBranch(duplicates[segment])
-		super(GraphExtension, self).__init__(duplicates)
+		super(GraphExtension, self).__init__([duplicates[X] for X in reduction.segments])
 		self.irreducibleSegments = frozenset(self.segments) 
 		self.irreducibleSides = frozenset(filter(lambda X: X.bond is not None, self.sides()))
 		self.irreducibleLabels = frozenset(segment.label for segment in self.segments if segment.label is not None)
@@ -52,8 +53,7 @@ class GraphExtension(DNAHistoryGraph):
 				self.segments.remove(segment) 
 		
 		# Recompute the event graph from scratch
-		self.eventGraph, self.segmentThreads = self.threads()
-		self.timeEventGraph()
+		self.rebuildEventGraph()
 
 	##################################
 	## Output
@@ -61,8 +61,14 @@ class GraphExtension(DNAHistoryGraph):
 	def irreducibleDot(self):
 		return ['node [style=filled]'] + [str(id(X)) for X in self.irreducibleSegments] + ['node [style=none]']
 
-	def dot(self):
-		return "\n".join(["digraph G {"] + self.irreducibleDot() + [X.dot() for X in self.eventGraph] + ["}"])
+	def writeDot(self, file):
+		renderer = DotRenderer(file)
+		renderer.line("digraph G {")
+		for line in self.irreducibleDot():
+			renderer.line(line)
+		for thread in self.eventGraph:
+			renderer.thread(thread)
+		renderer.line("}")
 
 def isNonTrivialLift(segment):
 	ancestor = segment.ancestor()
@@ -105,7 +111,7 @@ def hasNoGReducibleLabels(graph):
 
 def removeGReducibleLabel(segment, graph):
 	if hasGReducibleLabel(segment, graph):
-		segment.label = None
+		graph.deleteLabel(segment)
 		print 'G-Reducible label REMOVED'
 		return 1
 	else:
@@ -202,22 +208,15 @@ def hasNoGReducibleSegments(graph):
 
 def removeGReducibleSegment(segment, graph):
 	if isGReducibleSegment(segment, graph):
-		for child in list(segment.children):
-			graph.deleteBranch(segment, child)
-			if segment.parent is not None:
-				graph.createBranch(segment.parent, child)
-		if segment.parent is not None:
-			segment.parent.children.remove(segment)
-		graph.eventGraph.remove(graph.segmentThreads[segment])
-		del graph.segmentThreads[segment]
-		graph.segments.remove(segment)
+		# Reconnects the children to the parent, through the graph so that trackers and undo log follow
+		graph.deleteSegment(segment)
 		print 'G-Reducible segment REMOVED', id(segment)
 		return 1
 	else:
 		return 0
 
 def removeGReducibleSegments(graph):
-	return sum(map(lambda X: removeGReducibleSegment(X, graph), graph.segments))
+	return sum(map(lambda X: removeGReducibleSegment(X, graph), list(graph.segments)))
 
 def isHanging(side):
 	return len(side.liftedPartners()) == 0
@@ -0,0 +1,98 @@
+import unittest
+from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph, FULL
+from pyAVG.DNAHistoryGraph.extension import GraphExtension
+from pyAVG.DNAHistoryGraph.ambiguityCounter import AmbiguityCounter
+from pyAVG.DNAHistoryGraph.boundTracker import BoundTracker
+
+class ExtensionTest(unittest.TestCase):
+    """Tests the reduction of graph extensions back to G-bounded graphs
+    """
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        g = DNAHistoryGraph()
+        s1 = g.newSegment("A")
+        s2 = g.newSegment("T")
+        s3 = g.newSegment("T")
+        s4 = g.newSegment("A")
+        s5 = g.newSegment("A")
+        g.createBranch(s1, s2)
+        g.createBranch(s1, s3)
+        g.createBranch(s3, s4)
+        g.createBranch(s3, s5)
+
+        s1b = g.newSegment("A")
+        s2b = g.newSegment("A")
+        s3b = g.newSegment()
+        s4b = g.newSegment("T")
+        s5b = g.newSegment("T")
+        g.createBranch(s1b, s2b)
+        g.createBranch(s1b, s3b)
+        g.createBranch(s3b, s4b)
+        g.createBranch(s3b, s5b)
+        g.createBond(s2.left, s2b.left)
+
+        self.g = GraphExtension(g)
+        self.s4 = self.g.segments.segment(s4.id)
+        self.s4b = self.g.segments.segment(s4b.id)
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+
+    def extend(self):
+        #Leaf labels, isolated segment and free branch, all G-reducible
+        for label in ("G", "C"):
+            self.g.createBranch(self.s4, self.g.newSegment(label))
+        self.g.newSegment()
+        self.g.interpolateSegment(self.s4b)
+
+    def testAmbiguityTracking(self):
+        ambiguity = self.g.ambiguity()
+        self.extend()
+        self.assertEquals(self.g.ambiguity(), ambiguity + 1)
+        self.g.makeGBounded()
+        self.assertEquals(len(self.g.segments), len(self.g.irreducibleSegments))
+        fresh = AmbiguityCounter(self.g)
+        self.assertEquals(self.g.substitutionAmbiguity(), fresh.substitutionAmbiguity)
+        self.assertEquals(self.g.rearrangementAmbiguity(), fresh.rearrangementAmbiguity)
+        self.assertEquals(self.g.ambiguity(), ambiguity)
+        self.assertTrue(self.g.validate())
+
+    def testBoundTracking(self):
+        def bounds(tracker):
+            return [tracker.lowerBoundSubstitutionCost, tracker.upperBoundSubstitutionCost, tracker.lowerBoundRearrangementCost, tracker.upperBoundRearrangementCost]
+        before = bounds(BoundTracker(self.g))
+        self.g.lowerBoundSubstitutionCost()
+        self.extend()
+        self.assertEquals(bounds(self.g.boundTracker), bounds(BoundTracker(self.g)))
+        self.assertNotEquals(bounds(self.g.boundTracker), before)
+        self.g.makeGBounded()
+        self.assertEquals(bounds(self.g.boundTracker), bounds(BoundTracker(self.g)))
+        self.assertEquals(bounds(self.g.boundTracker), before)
+        self.assertTrue(self.g.validate())
+
+    def testIncrementalValidation(self):
+        self.extend()
+        self.assertTrue(self.g.validate())
+        self.g.makeGBounded()
+        #Segments whose branches were rewired by the reduction
+        self.assertTrue(set([ self.s4, self.s4b, self.s4b.parent ]) <= self.g.touched)
+        self.assertTrue(self.g.validate(FULL, incremental=True))
+        self.assertEquals(self.g.touched, set())
+
+    def testRollback(self):
+        self.extend()
+        segments = set(self.g.segments)
+        labels = dict((X, str(X.label)) for X in segments)
+        self.g.checkpoint()
+        self.g.makeGBounded()
+        self.assertEquals(len(self.g.segments), len(self.g.irreducibleSegments))
+        self.g.rollback()
+        self.assertEquals(set(self.g.segments), segments)
+        self.assertEquals(dict((X, str(X.label)) for X in segments), labels)
+        self.assertEquals(len(self.s4.children), 2)
+        self.assertEquals(self.s4b.parent.label, None)
+        self.assertTrue(self.g.validate())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,66 @@
 #!/usr/bin/env python
 
 import copy
+import gc
+import sys
+from collections import Counter
+from cStringIO import StringIO
 
-import thread
-from traversal import Traversal
 from segment import Segment
+from segmentRegistry import SegmentRegistry
 from module import Module
+from ambiguityCounter import AmbiguityCounter
+from boundTracker import BoundTracker
+from liftedLabelIndex import LiftedLabelIndex
+from liftedBondIndex import LiftedBondIndex
+from threadForest import ThreadForest, ForestThread
+from dotRenderer import DotRenderer
 from pyAVG.utils.partialOrderSet import PartialOrderSet
 
+# Validation levels, see DNAHistoryGraph.validate()
+STRUCTURE = 0
+""" Pointers, registry and event graph membership of each segment """
+FULL = 1
+""" Also the cached lineages and the tracked ambiguities and bounds of each segment and of its lineage """
+PARANOID = 2
+""" Also rebuilds the threads, modules and running totals from scratch """
+
 class DNAHistoryGraph(object):
 	""" DNA History graph """
 
+	# Event graph implementation, CompactPartialOrderSet is a drop-in replacement for large graphs
+	eventGraphClass = PartialOrderSet
+	# Whether event graphs keep a ReachabilityIndex, which answers ancestry queries in constant time but takes O(n^2) bits over n threads
+	indexedEventGraph = False
+
 	##################################
 	## Basics
 	##################################
-	def __init__(self, segments=[]):
-		self.segments = list(segments)
+	def __init__(self, segments=[], threads=None):
+		""" Creates a graph over the segments, reusing the (eventGraph, ThreadForest) pair threads if provided instead of computing it """
+		self.segments = SegmentRegistry(segments)
+		self.liftedLabelIndex = LiftedLabelIndex()
+		self.liftedBondIndex = LiftedBondIndex()
+		for segment in self.segments:
+			segment.graph = self
+		# List of inverse primitive mutations, only kept between checkpoint() and rollback() or commit()
+		self.undoLog = None
+		self.checkpoints = []
+		# Objects notified of the lineages dirtied by each mutation, see _lineages()
+		self.trackers = []
+		self.ambiguityCounter = None
+		self.boundTracker = None
+		# Segments mutated since the last validation, and whether the graph awaits its first validation as a whole, see validate()
+		self.touched = set()
+		self.unvalidated = True
+		if threads is not None:
+			self.eventGraph, self.segmentThreads = threads
+			return
 		self.eventGraph, self.segmentThreads = self.threads()
 		try:
 			self.timeEventGraph()
 		except RuntimeError:
-			print self.dot()
+			self.dot(sys.stdout)
 			assert False
 
 	def __copy__(self):
@@ -39,30 +79,145 @@ class DNAHistoryGraph(object):
 
 			if segment.parent is not None:
 				duplicates[segment].parent = duplicates[segment.parent]
-			duplicates[segment].children = set(duplicates[X] for X in segment.children)
-		return DNAHistoryGraph(duplicates.values())
+			if len(segment.children) > 0:
+				duplicates[segment].children = set(duplicates[X] for X in segment.children)
+		# The thread partition and event graph ordering are remapped rather than recomputed
+		segmentThreads, threads = self.segmentThreads.remappedCopy(duplicates, self.eventGraph)
+		return DNAHistoryGraph([duplicates[X] for X in self.segments], (self.eventGraph.remappedCopy(threads), segmentThreads))
+
+	##################################
+	## Flat arrays
+	##################################
+	@staticmethod
+	def fromArrays(parents, leftBonds, rightBonds, labels, threadRanks=None):
+		"""
+		Builds a graph over segments numbered 0 to n-1, given for each segment its parent (-1 for roots), the partners of its left and right sides,
+		side 2j (resp. 2j+1) being the left (resp. right) side of segment j and -1 meaning unbonded, and its label or None.
+		Segments are wired directly, then threads are walked over the bond lists and the event graph ordered once, in time linear in the size of the graph.
+		If threadRanks gives the rank of the thread of each segment in an ordering of the event graph, e.g. as saved with the graph,
+		threads are added in that order, which the branches then keep without sorting.
+		Raises RuntimeError on out of range indices, inconsistent bonds or ranks, and on branches which make the event graph cyclic.
+		"""
+		if threadRanks is not None and len(threadRanks) != len(parents):
+			raise RuntimeError("Inconsistent thread ranks", len(threadRanks))
+		# Allocating the segments in bulk would trigger the cyclic garbage collector over and over, with nothing to collect yet
+		collecting = gc.isenabled()
+		gc.disable()
+		try:
+			return DNAHistoryGraph._fromArrays(parents, leftBonds, rightBonds, labels, threadRanks)
+		finally:
+			if collecting:
+				gc.enable()
+
+	@staticmethod
+	def _fromArrays(parents, leftBonds, rightBonds, labels, threadRanks):
+		assert len(parents) == len(leftBonds) == len(rightBonds) == len(labels)
+		# Negative indices other than -1 would silently wrap around
+		for parent in parents:
+			if not -1 <= parent < len(labels):
+				raise RuntimeError("Parent out of range", parent)
+		for values in (leftBonds, rightBonds):
+			for partner in values:
+				if not -1 <= partner < 2 * len(labels):
+					raise RuntimeError("Partner side out of range", partner)
+		bonds = (leftBonds, rightBonds)
+		segments = [Segment(X) for X in labels]
+		for i, segment in enumerate(segments):
+			if parents[i] >= 0:
+				parent = segments[parents[i]]
+				segment.parent = parent
+				if len(parent.children) == 0:
+					parent.children = set()
+				parent.children.add(segment)
+			for side in (2 * i, 2 * i + 1):
+				partner = bonds[side & 1][i]
+				if partner < 0:
+					continue
+				if bonds[partner & 1][partner >> 1] != side:
+					raise RuntimeError("Asymmetric bond", side, partner)
+				if partner >= side:
+					sideA = segments[i].sides()[side & 1]
+					sideB = segments[partner >> 1].sides()[partner & 1]
+					sideA.bond = sideB
+					sideB.bond = sideA
+		segmentThreads = ThreadForest.fromBonds(segments, [X for pair in zip(leftBonds, rightBonds) for X in pair])
+		segmentThreadList = [segmentThreads[X] for X in segments]
+		eventGraph = DNAHistoryGraph.eventGraphClass(indexed=DNAHistoryGraph.indexedEventGraph)
+		if threadRanks is None:
+			for thread in segmentThreadList:
+				if thread not in eventGraph:
+					eventGraph.add(thread)
+		else:
+			ranks = dict()
+			threads = [None] * len(segments)
+			for thread, rank in zip(segmentThreadList, threadRanks):
+				if not 0 <= rank < len(threads) or ranks.setdefault(thread, rank) != rank or threads[rank] not in (None, thread):
+					raise RuntimeError("Inconsistent thread ranks", rank)
+				threads[rank] = thread
+			for thread in threads:
+				if thread is not None:
+					eventGraph.add(thread)
+		# No sorting is needed if the branches agree with the ranks, otherwise the event graph is ordered once
+		eventGraph.addConstraints((segmentThreadList[parents[i]], segmentThreadList[i]) for i in range(len(segments)) if parents[i] >= 0)
+		return DNAHistoryGraph(segments, (eventGraph, segmentThreads))
+
+	def toArrays(self):
+		""" Returns the lists (parents, leftBonds, rightBonds, labels) from which fromArrays() rebuilds the graph, segments being numbered in iteration order """
+		segments = list(self.segments)
+		index = dict((X, i) for i, X in enumerate(segments))
+		def sideIndex(side):
+			if side is None:
+				return -1
+			return 2 * index[side.segment] + (not side.left)
+		parents = [-1 if X.parent is None else index[X.parent] for X in segments]
+		leftBonds = [sideIndex(X.left.bond) for X in segments]
+		rightBonds = [sideIndex(X.right.bond) for X in segments]
+		labels = [None if X.label is None else str(X.label) for X in segments]
+		return parents, leftBonds, rightBonds, labels
 
 	def newSegment(self, sequence=None):
 		segment = Segment(sequence=sequence)
+		segment.graph = self
 		self.segments.append(segment)
-		T = thread.Thread([Traversal(segment, True)])
-		self.eventGraph.add(T)
-		self.segmentThreads[segment] = T
+		self.eventGraph.add(self.segmentThreads.add(segment))
+		self._log('newSegment', segment)
+		self.touched.add(segment)
 		return segment
 
 	def deleteSegment(self, segment):
 		# Transitive extension of branches
 		parent = segment.parent
-		children = segment.children	
-		self.deleteBranch(parent, segment)
+		children = list(segment.children)
+		if parent is not None:
+			self.deleteBranch(parent, segment)
 		for child in children:
 			self.deleteBranch(segment, child)
-			self.createBranch(parent, child)
+			if parent is not None:
+				self.createBranch(parent, child)
 		# Deletion of bonds
 		self.deleteBond(segment.left)
 		self.deleteBond(segment.right)
-		# Discarding record
+		# Discarding record, the segment is now alone in an unconstrained thread
+		self._log('deleteSegment', segment, segment.id, self.segments.position(segment), self.segmentThreads[segment])
+		self.eventGraph.remove(self.segmentThreads.pop(segment))
 		self.segments.remove(segment)
+		segment._invalidateLineage()
+		segment.graph = None
+		self.touched.discard(segment)
+
+	def setLabel(self, segment, sequence):
+		before = self._beforeChange([segment], [])
+		self._log('label', segment, segment.label)
+		segment.setLabel(sequence)
+		self.touched.add(segment)
+		self._afterChange(before, [segment], [])
+
+	def deleteLabel(self, segment):
+		before = self._beforeChange([segment], [])
+		self._log('label', segment, segment.label)
+		segment.deleteLabel()
+		self.touched.add(segment)
+		self._afterChange(before, [segment], [])
 
 	def sideThread(self, side):
 		return self.segmentThreads[side.segment]
@@ -78,50 +233,90 @@ class DNAHistoryGraph(object):
 	## Online acyclicity verification
 	##################################
 	def threads(self):
-		""" Computes tuples (PartialOrderSet X, dict Y) which contains X) graph threads (no ordering) and Y) segment to thread mapping """
-		return reduce(lambda X, Y: Y.threads(X), self.segments, (PartialOrderSet(), dict()))
+		""" Computes tuples (PartialOrderSet X, ThreadForest Y) which contains X) graph threads (no ordering) and Y) segment to thread mapping """
+		segmentThreads = ThreadForest(self.segments)
+		eventGraph = self.eventGraphClass(indexed=self.indexedEventGraph)
+		for segment in self.segments:
+			if segmentThreads[segment] not in eventGraph:
+				eventGraph.add(segmentThreads[segment])
+		return eventGraph, segmentThreads
 
 	def timeEventGraph(self):
 		""" Adds timing constraints to unordered set of threads """	
-		for segment in self.segments:
-			if segment.parent is not None:
-				self.eventGraph.addConstraint(self.segmentThreads[segment.parent], self.segmentThreads[segment])
+		self.eventGraph.addConstraints((self.segmentThreads[X.parent], self.segmentThreads[X]) for X in self.segments if X.parent is not None)
+
+	def rebuildEventGraph(self):
+		""" Recomputes threads, event graph and trackers from scratch, e.g. after segments were edited directly """
+		assert self.undoLog is None, "Cannot rebuild the event graph while a checkpoint is open"
+		self.eventGraph, self.segmentThreads = self.threads()
+		self.timeEventGraph()
+		self.liftedLabelIndex.clear()
+		self.liftedBondIndex.clear()
+		for tracker in self.trackers:
+			tracker.reset()
+		self.touched = set()
+		self.unvalidated = True
 
 	def createBranch(self, segmentA, segmentB):
 		""" Creates branch between two segments, and throws RuntimeError if cycle is created """
+		before = self._beforeChange([segmentB], segmentB.sides())
 		segmentA.createBranch(segmentB)
+		self._log('createBranch', segmentA, segmentB)
+		self.touched.update((segmentA, segmentB))
+		self._afterChange(before, [segmentB], segmentB.sides())
 		self.eventGraph.addConstraint(self.segmentThreads[segmentA], self.segmentThreads[segmentB])		
 
 	def deleteBranch(self, segmentA, segmentB):
-		""" Deletes branch between two segments, and throws RuntimeError if cycle is created """
+		""" Deletes branch between two segments, the thread constraint only goes with the last branch between the two threads """
+		before = self._beforeChange([segmentB], segmentB.sides())
 		segmentA.deleteBranch(segmentB)
-		threadA = self.segmentThreads[segmentA]
-		threadB = self.segmentThreads[segmentB]
-		if not any(X.segment.parent is not None and self.segmentThreads[X.segment.parent] is threadA for X in threadB):
-			self.eventGraph.removeConstraint(self.segmentThreads[segmentA], self.segmentThreads[segmentB])		
+		self._log('deleteBranch', segmentA, segmentB)
+		self.touched.update((segmentA, segmentB))
+		self._afterChange(before, [segmentB], segmentB.sides())
+		self.eventGraph.removeConstraint(self.segmentThreads[segmentA], self.segmentThreads[segmentB])		
 
 	def createBond(self, sideA, sideB):
 		""" Creates bond between two sides and throws RuntimeError if cycle created """
 		assert sideA.bond is None and sideB.bond is None
+		before = self._beforeChange([], [sideA, sideB])
 		sideA.createBond(sideB)
-		if self.segmentThreads[sideB.segment] is not self.segmentThreads[sideA.segment]:
-			oldThread = self.segmentThreads[sideA.segment]
-			oldThread2 = self.segmentThreads[sideB.segment]
-			newThread = sideA.segment.thread()
+		self._log('createBond', sideA)
+		self.touched.update((sideA.segment, sideB.segment))
+		self._afterChange(before, [], [sideA, sideB])
+		oldThread = self.segmentThreads[sideA.segment]
+		oldThread2 = self.segmentThreads[sideB.segment]
+		if oldThread is not oldThread2:
+			# The longer thread absorbs the shorter one
+			if len(oldThread) >= len(oldThread2):
+				thread, moved = oldThread, oldThread2
+			else:
+				thread, moved = oldThread2, oldThread
+			segments = moved.segments()
+			self._log('linkThreads', sideA, sideB, oldThread, oldThread2)
+			self.segmentThreads.link(sideA, sideB, thread)
 
 			# Updating self.eventGraph
-			self.eventGraph.add(newThread)
-			self.eventGraph.remove(oldThread)
-			self.eventGraph.remove(oldThread2)
-			
-			for traversal in newThread:
-			    self.segmentThreads[traversal.segment] = newThread
-			for traversal in newThread:
-			    if traversal.segment.parent is not None:
-				    self.eventGraph.addConstraint(self.segmentThreads[traversal.segment.parent], newThread)
-			    for child in traversal.segment.children:
-				    self.eventGraph.addConstraint(newThread, self.segmentThreads[child])
+			self._moveSegments(segments, moved, thread)
+			self.eventGraph.remove(moved)
+		else:
+			# Closing a cycle, or bonding a side to itself
+			self._log('linkThreads', sideA, sideB, oldThread, oldThread)
+			self.segmentThreads.link(sideA, sideB, oldThread)
 				
+	def _moveSegments(self, segments, oldThread, thread):
+		""" Moves the timing constraints of the branches incident to segments, which just left oldThread for thread """
+		# The other ends of these branches cannot be in either thread, or there would be a cycle
+		self.touched.update(segments)
+		for segment in segments:
+			if segment.parent is not None:
+				parentThread = self.segmentThreads[segment.parent]
+				self.eventGraph.removeConstraint(parentThread, oldThread)
+				self.eventGraph.addConstraint(parentThread, thread)
+			for child in segment.children:
+				childThread = self.segmentThreads[child]
+				self.eventGraph.removeConstraint(oldThread, childThread)
+				self.eventGraph.addConstraint(thread, childThread)
+
 	def sideThread(self, side):
 		return self.segmentThreads[side.segment]
 	
@@ -131,29 +326,169 @@ class DNAHistoryGraph(object):
 	def deleteBond(self, sideA):
 		""" Deletes bond between two sides and updates event graph """
 		sideB = sideA.bond
+		if sideB is not None:
+			before = self._beforeChange([], [sideA, sideB])
 		sideA.deleteBond()
 		if sideB is not None:
-			thread = sideA.segment.thread()
-			if sideB.segment not in [traversal.segment for traversal in thread]:
-				oldThread = self.sideThread(sideA)
-				thread2 = sideB.segment.thread()
+			self._log('deleteBond', sideA, sideB)
+			self.touched.update((sideA.segment, sideB.segment))
+			self._afterChange(before, [], [sideA, sideB])
+			oldThread = self.sideThread(sideA)
+			if not self.segmentThreads.splits(sideA, sideB):
+				# Opening a cycle, or unbonding a side from itself
+				self._log('cutThreads', sideA, sideB, oldThread)
+				self.segmentThreads.cut(sideA, sideB, oldThread, oldThread)
+			else:
+				# The longer half keeps the thread
+				moved = ForestThread(self.segmentThreads)
+				sizeA, sizeB = self.segmentThreads.cutSizes(sideA, sideB)
+				self._log('cutThreads', sideA, sideB, oldThread)
+				if sizeA >= sizeB:
+					self.segmentThreads.cut(sideA, sideB, oldThread, moved)
+				else:
+					self.segmentThreads.cut(sideA, sideB, moved, oldThread)
 
 				# Updating self.eventGraph
-				self.eventGraph.remove(oldThread)
-				self.eventGraph.add(thread)
-				self.eventGraph.add(thread2)
-				for traversal in thread:
-					self.segmentThreads[traversal.segment] = thread
-					if traversal.segment.parent is not None:
-						self.eventGraph.addConstraint(self.segmentThreads[traversal.segment.parent], thread)
-					for child in traversal.segment.children:
-						self.eventGraph.addConstraint(thread, self.segmentThreads[child])
-				for traversal in thread2:
-					self.segmentThreads[traversal.segment] = thread2
-					if traversal.segment.parent is not None:
-						self.eventGraph.addConstraint(self.segmentThreads[traversal.segment.parent], thread2)
-					for child in traversal.segment.children:
-						self.eventGraph.addConstraint(thread2, self.segmentThreads[child])
+				self.eventGraph.add(moved)
+				self._moveSegments(moved.segments(), oldThread, moved)
+
+	##################################
+	## Undo log
+	##################################
+	def _log(self, *entry):
+		if self.undoLog is not None:
+			self.undoLog.append(entry)
+
+	def checkpoint(self):
+		""" Opens a (possibly nested) checkpoint, all subsequent mutations through the graph can be undone by rollback() """
+		if self.undoLog is None:
+			self.undoLog = []
+		self.checkpoints.append(len(self.undoLog))
+		# The event graph keeps its own log of the thread and constraint changes
+		self.eventGraph.begin()
+
+	def commit(self):
+		""" Closes the innermost checkpoint, keeping its changes """
+		self.checkpoints.pop()
+		if len(self.checkpoints) == 0:
+			self.undoLog = None
+		self.eventGraph.commit()
+
+	def _undo(self, entry):
+		if entry[0] in ('createBranch', 'deleteBranch'):
+			segments, sides = [entry[2]], entry[2].sides()
+		elif entry[0] == 'label':
+			segments, sides = [entry[1]], []
+		elif entry[0] == 'createBond':
+			segments, sides = [], [entry[1], entry[1].bond]
+		elif entry[0] == 'deleteBond':
+			segments, sides = [], [entry[1], entry[2]]
+		else:
+			segments, sides = [], []
+		before = self._beforeChange(segments, sides)
+		self._undoEntry(entry)
+		self._afterChange(before, segments, sides)
+
+	def _undoEntry(self, entry):
+		if entry[0] == 'newSegment':
+			self.segments.remove(entry[1])
+			self.segmentThreads.pop(entry[1])
+			entry[1]._invalidateLineage()
+			entry[1].graph = None
+			self.touched.discard(entry[1])
+		elif entry[0] == 'deleteSegment':
+			segment, id, position, T = entry[1:]
+			self.segments.restore(segment, id, position)
+			self.segmentThreads.add(segment, T)
+			segment.graph = self
+			self.touched.add(segment)
+		elif entry[0] == 'label':
+			if entry[2] is None:
+				entry[1].deleteLabel()
+			else:
+				entry[1].setLabel(str(entry[2]))
+			self.touched.add(entry[1])
+		elif entry[0] == 'createBranch':
+			entry[1].deleteBranch(entry[2])
+			self.touched.update(entry[1:])
+		elif entry[0] == 'deleteBranch':
+			entry[1].createBranch(entry[2])
+			self.touched.update(entry[1:])
+		elif entry[0] == 'createBond':
+			self.touched.update((entry[1].segment, entry[1].bond.segment))
+			entry[1].deleteBond()
+		elif entry[0] == 'deleteBond':
+			entry[1].createBond(entry[2])
+			self.touched.update((entry[1].segment, entry[2].segment))
+		elif entry[0] == 'linkThreads':
+			self.segmentThreads.cut(*entry[1:])
+			self._touchMoved(entry[1], entry[2])
+		elif entry[0] == 'cutThreads':
+			self._touchMoved(entry[1], entry[2])
+			self.segmentThreads.link(*entry[1:])
+		else:
+			assert False, entry
+
+	def _touchMoved(self, sideA, sideB):
+		""" Marks the segments of the shorter of the threads of two sides, which are the ones moved when these threads are linked or cut apart """
+		threadA = self.segmentThreads[sideA.segment]
+		threadB = self.segmentThreads[sideB.segment]
+		if threadA is threadB:
+			self.touched.update((sideA.segment, sideB.segment))
+		elif len(threadA) < len(threadB):
+			self.touched.update(threadA.segments())
+		else:
+			self.touched.update(threadB.segments())
+
+	def rollback(self):
+		""" Closes the innermost checkpoint, undoing its mutations in time proportional to their number """
+		checkpoint = self.checkpoints.pop()
+		log = self.undoLog
+		self.undoLog = None
+		while len(log) > checkpoint:
+			self._undo(log.pop())
+		if len(self.checkpoints) > 0:
+			self.undoLog = log
+		self.eventGraph.rollback()
+
+	##################################
+	## Mutation tracking
+	##################################
+	def _lineages(self, segments, sides):
+		"""
+		Returns the sets of segments and sides whose ambiguity can depend on the labels and parents of segments
+		and on the bonds and parents of sides, i.e. their lineages up to their lifting ancestors
+		"""
+		dirtySegments = set()
+		for segment in segments:
+			dirtySegments.add(segment)
+			dirtySegments.add(segment.ancestor())
+		dirtySides = set()
+		for side in sides:
+			# Junctions between a side and its lifting ancestor qualify the lifted bonds of the ancestor, and of their partners
+			ancestor = side.ancestor()
+			for descendant in ancestor.liftedBonds() | side.liftedBonds():
+				dirtySides.add(descendant.bond.ancestor())
+			while side is not ancestor:
+				dirtySides.add(side)
+				side = side.parent()
+			dirtySides.add(ancestor)
+		return dirtySegments, dirtySides
+
+	def _beforeChange(self, segments, sides):
+		if len(self.trackers) == 0:
+			return None
+		return self._lineages(segments, sides)
+
+	def _afterChange(self, before, segments, sides):
+		""" Notifies the trackers of the lineages dirtied by a mutation, before and after it """
+		if before is None:
+			return
+		dirtySegments, dirtySides = self._lineages(segments, sides)
+		dirtySegments |= before[0]
+		dirtySides |= before[1]
+		for tracker in self.trackers:
+			tracker.update(dirtySegments, dirtySides)
 
 	def areSiblings(self, threadA, threadB):
 		return self.eventGraph.testConstraint(threadA, threadB) and self.eventGraph.testConstraint(threadB, threadA) 
@@ -190,11 +525,18 @@ class DNAHistoryGraph(object):
 	##################################
 	## Ambiguity
 	##################################
+	def _ambiguityCounter(self):
+		# Built on first use, then kept up to date by the mutation primitives
+		if self.ambiguityCounter is None:
+			self.ambiguityCounter = AmbiguityCounter(self)
+			self.trackers.append(self.ambiguityCounter)
+		return self.ambiguityCounter
+
 	def substitutionAmbiguity(self):
-		return sum(segment.substitutionAmbiguity() for segment in self.segments)
+		return self._ambiguityCounter().substitutionAmbiguity
 
 	def rearrangementAmbiguity(self):
-		return sum([ x.rearrangementAmbiguity() for x in self.sides() ])
+		return self._ambiguityCounter().rearrangementAmbiguity
 	
 	def ambiguity(self):
 		return self.substitutionAmbiguity() + self.rearrangementAmbiguity()
@@ -206,31 +548,46 @@ class DNAHistoryGraph(object):
 	## Cost
 	##################################
 	
+	def _boundTracker(self):
+		# Built on first use, then kept up to date by the mutation primitives
+		if self.boundTracker is None:
+			self.boundTracker = BoundTracker(self)
+			self.trackers.append(self.boundTracker)
+		return self.boundTracker
+
 	def lowerBoundSubstitutionCost(self):
-		return sum(X.lowerBoundSubstitutionCost() for X in self.segments)
+		return self._boundTracker().lowerBoundSubstitutionCost
 	
 	def upperBoundSubstitutionCost(self):
-		return sum(X.upperBoundSubstitutionCost() for X in self.segments)
+		return self._boundTracker().upperBoundSubstitutionCost
 
 	def sides(self):
-		return sum([X.sides() for X in self.segments], [])
+		return [Y for X in self.segments for Y in X.sides()]
 
 	def _moduleSides(self):
 		return filter(lambda X: X.isModuleMaterial(), self.sides())
 
-	def modules(self):
+	def _computeModules(self):
+		""" Builds the modules from scratch """
 		seen = set()
 		def fn(m):
 			for x in m.sides:
 				seen.add(x)
 			return m
 		return [ fn(Module(x)) for x in self._moduleSides() if x not in seen ]
+
+	def modulePartition(self):
+		""" Returns the ModulePartition of the graph, kept up to date along with the cost bounds """
+		return self._boundTracker().partition
+
+	def modules(self):
+		return list(self.modulePartition())
 	
 	def lowerBoundRearrangementCost(self):
-		return sum(X.lowerBoundRearrangementCost() for X in self.modules())
+		return self._boundTracker().lowerBoundRearrangementCost
 	
 	def upperBoundRearrangementCost(self):
-		return sum(X.upperBoundRearrangementCost() for X in self.modules())
+		return self._boundTracker().upperBoundRearrangementCost
 	
 	##################################
 	## Ancestry queries
@@ -245,24 +602,70 @@ class DNAHistoryGraph(object):
 	##################################
 	## Output
 	##################################
-	def dot(self):
-		return "\n".join(["digraph G {" ] + [X.dot() for X in self.eventGraph] + ["}"])
+	def dot(self, file=None):
+		""" Returns the GraphViz output of the graph, or streams it to a file object if given rather than building it in memory """
+		if file is not None:
+			self.writeDot(file)
+			return
+		output = StringIO()
+		self.writeDot(output)
+		return output.getvalue()
+
+	def writeDot(self, file):
+		""" Writes the output of dot() to a file object as it goes """
+		renderer = DotRenderer(file)
+		renderer.line("digraph G {")
+		for thread in self.eventGraph:
+			renderer.thread(thread)
+		renderer.line("}")
 
 	##################################
 	## Validation
 	##################################
-	def validate(self):
-		assert all(X.validate() for X in self.segments)
-		assert all(X.parent in self.segments for X in self.segments if X.parent is not None)
-		assert all(X.parent in self.segmentThreads for X in self.segments if X.parent is not None)
-		assert all(self.segmentThreads[X] in self.eventGraph for X in self.segments)
-		assert all(self.segmentThreads[X.parent] in self.eventGraph.parents[self.segmentThreads[X]] for X in self.segments if X.parent is not None)
-		assert all(self.segmentThreads[X] in self.eventGraph.children[self.segmentThreads[X.parent]] for X in self.segments if X.parent is not None)
-		assert all(Y in self.segments for X in self.segments for Y in X.children)
-		assert all(X.left.bond.segment in self.segments for X in self.segments if X.left.bond is not None)
-		assert all(X.right.bond.segment in self.segments for X in self.segments if X.right.bond is not None)
-		assert self.eventGraph.validate()
-		assert self.lowerBoundSubstitutionCost() <= self.upperBoundSubstitutionCost()
-		assert self.lowerBoundRearrangementCost() <= self.upperBoundRearrangementCost()
-		#assert all(X.validate(self) for X in self.modules())
+	def validate(self, level=PARANOID, incremental=False):
+		"""
+		Checks the invariants of the given level, for all segments or only for those touched since the last validation if incremental.
+		Incremental checks take time proportional to the mutations since, except at the PARANOID level which always covers the whole graph,
+		and on a graph never validated since it was built or rebuilt.
+		"""
+		if incremental and not self.unvalidated:
+			segments = [X for X in self.touched if X in self.segments]
+		else:
+			segments = self.segments
+		assert len(self.segmentThreads) == len(self.segments)
+		assert all(self._validateSegment(X) for X in segments)
+		if level >= FULL:
+			dirtySegments, dirtySides = self._lineages(segments, [Y for X in segments for Y in X.sides()])
+			assert self.liftedLabelIndex.validate(dirtySegments)
+			assert self.liftedBondIndex.validate(dirtySides)
+			assert all(X.validate(dirtySegments, dirtySides) for X in self.trackers)
+		if level >= PARANOID:
+			assert self.segments.validate()
+			assert self.liftedLabelIndex.validate()
+			assert self.liftedBondIndex.validate()
+			assert self.segmentThreads.validate()
+			branchCounts = Counter((self.segmentThreads[X.parent], self.segmentThreads[X]) for X in self.segments if X.parent is not None)
+			assert all(self.eventGraph.constraintMultiplicity(X, Y) == branchCounts[(X, Y)] for X in self.eventGraph for Y in self.eventGraph.children[X])
+			assert self.eventGraph.validate()
+			assert all(X.validate() for X in self.trackers)
+			assert self.lowerBoundSubstitutionCost() <= self.upperBoundSubstitutionCost()
+			assert self.lowerBoundRearrangementCost() <= self.upperBoundRearrangementCost()
+			#assert all(X.validate(self) for X in self.modules())
+		self.touched = set()
+		self.unvalidated = False
+		return True
+
+	def _validateSegment(self, segment):
+		""" Checks the STRUCTURE invariants of a segment """
+		assert segment.validate()
+		assert segment.graph is self and segment in self.segments
+		assert segment.parent is None or segment.parent in self.segments
+		assert all(X in self.segments for X in segment.children)
+		assert all(X.bond.segment in self.segments for X in segment.sides() if X.bond is not None)
+		thread = self.segmentThreads[segment]
+		assert thread in self.eventGraph
+		if segment.parent is not None:
+			parentThread = self.segmentThreads[segment.parent]
+			assert parentThread in self.eventGraph.parents[thread]
+			assert thread in self.eventGraph.children[parentThread]
 		return True
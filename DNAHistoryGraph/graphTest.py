@@ -1,5 +1,21 @@
 import unittest
-from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph
+import copy
+import random
+from StringIO import StringIO
+from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph, STRUCTURE, FULL
+from pyAVG.DNAHistoryGraph.columnarGraph import ColumnarGraph
+from pyAVG.DNAHistoryGraph.segment import Segment
+from pyAVG.DNAHistoryGraph.threadForest import ThreadForest
+from pyAVG.inputs.simulator import RandomHistory
+from pyAVG.process.deAVG import deAVG
+
+def metrics(graph):
+    """Ambiguities and cost bounds, which other representations of a graph must reproduce"""
+    return [graph.substitutionAmbiguity(), graph.rearrangementAmbiguity(), graph.lowerBoundSubstitutionCost(), graph.upperBoundSubstitutionCost(), graph.lowerBoundRearrangementCost(), graph.upperBoundRearrangementCost()]
+
+def randomGraphs(number=5):
+    """Small random graphs, with the ambiguities left by deAVG"""
+    return [deAVG(RandomHistory(3, 3).avg()) for i in range(number)]
 
 class DNAHistoryGraphTest(unittest.TestCase):
     """Tests the DNA history graph functions, particularly the acyclicity functions
@@ -93,6 +109,325 @@ class DNAHistoryGraphTest(unittest.TestCase):
         self.assertEquals(self.s3.left.bond, self.s4b.left)
         self.assertEquals(self.s4b.left.bond, self.s3.left)
     
+    def testDeleteBranch(self):
+        #Two branches between the same pair of threads
+        self.g.createBond(self.s2.right, self.s3.left)
+        parentThread = self.g.segmentThread(self.s1)
+        childThread = self.g.segmentThread(self.s2)
+        self.assertEquals(self.g.eventGraph.constraintMultiplicity(parentThread, childThread), 2)
+        self.g.deleteBranch(self.s1, self.s2)
+        self.assertEquals(self.g.threadCmp(parentThread, childThread), -1)
+        self.g.deleteBranch(self.s1, self.s3)
+        self.assertEquals(self.g.threadCmp(parentThread, childThread), 0)
+        self.assertTrue(self.g.validate())
+
+    def testCopy(self):
+        self.g.createBond(self.s1.left, self.s1b.left)
+        self.g.createBond(self.s3.right, self.s3b.left)
+        duplicate = copy.copy(self.g)
+        self.assertTrue(duplicate.validate())
+        self.assertEquals(len(duplicate.segments), len(self.g.segments))
+        self.assertEquals(len(duplicate.eventGraph), len(self.g.eventGraph))
+        self.assertEquals(duplicate.substitutionAmbiguity(), self.g.substitutionAmbiguity())
+        self.assertEquals(duplicate.rearrangementAmbiguity(), self.g.rearrangementAmbiguity())
+        #Same ordering of the remapped threads, independent of the original
+        s1, s3, s4 = [ duplicate.segments.segment(X.id) for X in (self.s1, self.s3, self.s4) ]
+        self.assertEquals(duplicate.threadCmp(duplicate.segmentThread(s1), duplicate.segmentThread(s4)), -1)
+        duplicate.deleteBranch(s3, s4)
+        self.assertEquals(duplicate.threadCmp(duplicate.segmentThread(s1), duplicate.segmentThread(s4)), 0)
+        self.assertEquals(self.g.threadCmp(self.g.segmentThread(self.s1), self.g.segmentThread(self.s4)), -1)
+        self.assertTrue(self.g.validate())
+
+    def testRollback(self):
+        self.g.createBond(self.s1.left, self.s1b.left)
+        threads = set(self.g.eventGraph)
+        self.g.checkpoint()
+        s6 = self.g.interpolateSegment(self.s3)
+        self.g.setLabel(s6, "A")
+        self.g.deleteBond(self.s1.left)
+        self.g.createBond(self.s3.left, self.s4b.left)
+        self.g.checkpoint()
+        self.g.deleteLabel(self.s2)
+        self.g.rollback()
+        self.assertEquals(str(self.s2.label), "T")
+        self.g.rollback()
+        self.assertTrue(self.g.validate())
+        self.assertEquals(len(self.g.segments), 10)
+        self.assertEquals(self.s3.parent, self.s1)
+        self.assertEquals(self.s3.left.bond, None)
+        self.assertEquals(self.s1.left.bond, self.s1b.left)
+        self.assertEquals(set(self.g.eventGraph), threads)
+        self.assertEquals(self.g.segmentThread(self.s1), self.g.segmentThread(self.s1b))
+        self.assertEquals(self.g.substitutionAmbiguity(), 3)
+
+    def testLiftedLabelIndex(self):
+        self.assertEquals(self.s4b.ancestor(), self.s1b)
+        self.assertEquals(self.s1b.liftedLabels(), set([ self.s2b, self.s4b, self.s5b ]))
+        self.g.setLabel(self.s3b, "C")
+        self.assertEquals(self.s4b.ancestor(), self.s3b)
+        self.assertEquals(self.s1b.liftedLabels(), set([ self.s2b, self.s3b ]))
+        self.g.deleteBranch(self.s1b, self.s3b)
+        self.g.deleteLabel(self.s3b)
+        self.assertEquals(self.s4b.ancestor(), self.s3b)
+        self.assertEquals(self.s1b.liftedLabels(), set([ self.s2b ]))
+        self.g.createBranch(self.s2, self.s3b)
+        self.assertEquals(self.s5b.ancestor(), self.s2)
+        self.assertEquals(self.s1.liftedLabels(), set([ self.s2, self.s3 ]))
+        self.assertEquals(self.s2.liftedLabels(), set([ self.s4b, self.s5b ]))
+        self.assertTrue(self.g.validate())
+
+    def testLiftedBondIndex(self):
+        self.g.createBond(self.s4.left, self.s4b.left)
+        self.g.createBond(self.s5.left, self.s5b.left)
+        self.assertEquals(self.s4.left.ancestor(), self.s1.left)
+        self.assertEquals(self.s1.left.liftedBonds(), set([ self.s4.left, self.s5.left ]))
+        self.assertTrue(self.s3.left.isJunction())
+        self.assertFalse(self.s1.left.isJunction())
+        self.g.createBond(self.s3.left, self.s3b.left)
+        self.assertEquals(self.s4.left.ancestor(), self.s3.left)
+        self.assertEquals(self.s1.left.liftedBonds(), set([ self.s3.left ]))
+        self.g.deleteBond(self.s5.left)
+        self.assertFalse(self.s3.left.isJunction())
+        self.assertFalse(self.s5.left._hasAttachedDescent())
+        self.assertTrue(self.s1.left._hasAttachedDescent())
+        self.g.deleteBranch(self.s3, self.s4)
+        self.assertEquals(self.s4.left.ancestor(), self.s4.left)
+        self.assertEquals(self.s3.left.liftedBonds(), set())
+        self.assertTrue(self.g.validate())
+
+    def testThreadForest(self):
+        s6 = self.g.newSegment("C")
+        self.g.createBond(self.s2.right, self.s4.left)
+        self.g.createBond(self.s2.left, s6.left)
+        self.assertEquals(self.g.segmentThread(s6), self.g.segmentThread(self.s4))
+        self.assertEquals(set(self.g.segmentThread(s6).segments()), set([ self.s2, self.s4, s6 ]))
+        self.assertFalse(self.g.segmentThread(s6).isCycle())
+        # Closing then opening a cycle keeps the thread
+        thread = self.g.segmentThread(s6)
+        self.g.createBond(self.s4.right, s6.right)
+        self.assertTrue(thread.isCycle())
+        self.g.deleteBond(self.s2.left)
+        self.assertEquals(self.g.segmentThread(self.s2), thread)
+        self.assertFalse(thread.isCycle())
+        self.assertEquals(len(thread), 3)
+        self.assertTrue(self.g.validate())
+        self.g.checkpoint()
+        self.g.deleteBond(self.s4.left)
+        self.assertNotEquals(self.g.segmentThread(self.s2), self.g.segmentThread(self.s4))
+        self.assertEquals(self.g.segmentThread(s6), self.g.segmentThread(self.s4))
+        self.assertTrue(self.g.validate())
+        self.g.rollback()
+        self.assertEquals(self.g.segmentThread(self.s2), thread)
+        self.assertEquals(self.g.segmentThread(self.s4), thread)
+        self.assertTrue(self.g.validate())
+        # Walks over flat bond lists, sides bonded to themselves and cycles included
+        for i in range(20):
+            segments = [ Segment() for X in range(8) ]
+            sides = range(16)
+            random.shuffle(sides)
+            bonds = [-1] * 16
+            while len(sides) > 1:
+                sideA = sides.pop()
+                sideB = random.choice([ sideA ] + sides)
+                if sideB != sideA:
+                    sides.remove(sideB)
+                if random.random() < 0.8:
+                    bonds[sideA] = sideB
+                    bonds[sideB] = sideA
+                    segments[sideA >> 1].sides()[sideA & 1].createBond(segments[sideB >> 1].sides()[sideB & 1])
+            forest = ThreadForest.fromBonds(segments, bonds)
+            walked = ThreadForest(segments)
+            for segment in segments:
+                self.assertEquals(forest.sequences.elements(segment), walked.sequences.elements(segment))
+                self.assertEquals(forest[segment] in forest.cycles, walked[segment] in walked.cycles)
+
+    def testStableThreads(self):
+        s6 = self.g.newSegment("C")
+        thread = self.g.segmentThread(self.s2)
+        self.g.createBond(self.s2.right, self.s4.left)
+        self.g.createBond(self.s4.right, s6.left)
+        # Shorter threads are absorbed by longer ones
+        self.assertEquals(self.g.segmentThread(s6), thread)
+        self.g.createBond(self.s5.left, s6.right)
+        self.assertEquals(self.g.segmentThread(self.s5), thread)
+        self.assertEquals(self.g.eventGraph.constraintMultiplicity(self.g.segmentThread(self.s3), thread), 2)
+        # The longer half keeps the thread
+        self.g.deleteBond(self.s2.right)
+        self.assertEquals(self.g.segmentThread(self.s4), thread)
+        self.assertNotEquals(self.g.segmentThread(self.s2), thread)
+        self.assertEquals(self.g.eventGraph.constraintMultiplicity(self.g.segmentThread(self.s1), thread), 0)
+        self.assertTrue(self.g.validate())
+
+    def testThreadTraversals(self):
+        s6 = self.g.newSegment("C")
+        thread = self.g.segmentThread(self.s2)
+        self.assertEquals([ X.segment for X in thread ], [ self.s2 ])
+        self.g.createBond(self.s2.right, self.s4.left)
+        self.g.createBond(self.s4.right, s6.right)
+        # The walk is cached until the forest changes the thread
+        traversals = thread.traversals
+        self.assertTrue(thread.traversals is traversals)
+        self.assertEquals([ X.segment for X in thread ], thread.segments())
+        self.assertEquals([ X.orientation for X in thread ], [ True, True, False ])
+        self.assertEquals(thread[-1], traversals[2])
+        self.g.createBond(self.s2.left, s6.left)
+        self.assertTrue(thread.isCycle())
+        self.assertEquals([ X.segment for X in thread ], thread.segments())
+        self.g.deleteBond(self.s4.right)
+        self.assertEquals([ X.segment for X in thread ], thread.segments())
+        self.assertTrue(thread[0].isConnected(thread[1]))
+        self.assertTrue(thread[1].isConnected(thread[2]))
+
+    def testSegmentRegistry(self):
+        self.assertEquals(sorted(X.id for X in self.g.segments), range(10))
+        self.assertEquals(self.s2.right.id, 2 * self.s2.id + 1)
+        self.assertEquals(self.g.segmentThread(self.s2)[0].id, self.s2.left.id)
+        order = list(self.g.segments)
+        self.assertEquals(order, [ self.s1, self.s2, self.s3, self.s4, self.s5, self.s1b, self.s2b, self.s3b, self.s4b, self.s5b ])
+        self.g.checkpoint()
+        id = self.s3b.id
+        self.g.deleteSegment(self.s3b)
+        self.assertFalse(self.s3b in self.g.segments)
+        self.assertEquals(len(self.g.segments), 9)
+        # The last segment takes the place of the removed one
+        self.assertEquals(list(self.g.segments), order[:7] + [ self.s5b, self.s4b ])
+        self.assertEquals(self.g.segments[7], self.s5b)
+        # Freed IDs are reused, new segments come last
+        s6 = self.g.newSegment()
+        self.assertEquals(s6.id, id)
+        self.assertEquals(self.g.segments.segment(id), s6)
+        self.assertEquals(self.g.segments[-1], s6)
+        self.assertTrue(self.g.validate())
+        self.g.rollback()
+        self.assertEquals(self.s3b.id, id)
+        self.assertTrue(self.s3b in self.g.segments)
+        self.assertFalse(s6 in self.g.segments)
+        self.assertEquals(list(self.g.segments), order)
+        self.assertTrue(self.g.validate())
+
+    def testModulePartition(self):
+        def partition(modules):
+            return sorted(sorted(id(X) for X in Y.sides) for Y in modules)
+        self.assertEquals(self.g.modules(), [])
+        self.g.createBond(self.s4.left, self.s4b.left)
+        self.g.createBond(self.s5.left, self.s5b.left)
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.assertEquals(partition(self.g.modules()), partition(self.g._computeModules()))
+        #Splitting the module
+        self.g.deleteBond(self.s2.left)
+        self.assertEquals(partition(self.g.modules()), partition(self.g._computeModules()))
+        self.g.createBond(self.s3.left, self.s3b.left)
+        self.assertEquals(partition(self.g.modules()), partition(self.g._computeModules()))
+        self.assertTrue(all(X.isSimple() for X in self.g.modules()))
+        self.assertTrue(self.g.validate())
+
+    def testColumnarGraph(self):
+        self.assertEquals(metrics(ColumnarGraph(self.g)), metrics(self.g))
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.g.createBond(self.s4.left, self.s5b.left)
+        self.g.createBond(self.s5.left, self.s4b.left)
+        self.g.setLabel(self.s3b, "R")
+        columns = ColumnarGraph(self.g)
+        self.assertEquals(metrics(columns), metrics(self.g))
+        self.assertEquals(columns.moduleNumber, len(self.g.modules()))
+        self.assertEquals(columns.alphabet, "ACGTR")
+        self.assertEquals(sorted(columns.parents).count(-1), len([X for X in self.g.segments if X.parent is None]))
+        for graph in [self.g] + randomGraphs():
+            columns = ColumnarGraph(graph)
+            self.assertEquals(metrics(columns), metrics(graph))
+            # Lifting queries, segments and sides being numbered in iteration order
+            segments = list(graph.segments)
+            number = dict((X, i) for i, X in enumerate(segments))
+            def sideNumbers(sides):
+                return set(2 * number[X.segment] + (not X.left) for X in sides)
+            for i, segment in enumerate(segments):
+                self.assertEquals(columns.ancestor(i), number[segment.ancestor()])
+                self.assertEquals(columns.liftedLabels(i), set(number[X] for X in segment.liftedLabels()))
+                self.assertEquals(columns.nonTrivialLiftedLabels(i), set(number[X] for X in segment.nonTrivialLiftedLabels()))
+                for side in segment.sides():
+                    sideNumber = 2 * i + (not side.left)
+                    self.assertEquals(columns.sideAncestor(sideNumber), list(sideNumbers([side.ancestor()]))[0])
+                    self.assertEquals(columns.liftedBonds(sideNumber), sideNumbers(side.liftedBonds()))
+                    self.assertEquals(columns.nonTrivialLiftedBonds(sideNumber), sideNumbers(side.nonTrivialLiftedBonds()))
+
+    def testArrays(self):
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.g.createBond(self.s4.left, self.s5b.left)
+        self.g.createBond(self.s5.left, self.s4b.left)
+        for graph in [self.g] + randomGraphs():
+            arrays = graph.toArrays()
+            copy = DNAHistoryGraph.fromArrays(*arrays)
+            self.assertTrue(copy.validate())
+            self.assertEquals([X.id for X in copy.segments], range(len(graph.segments)))
+            self.assertEquals(copy.toArrays(), arrays)
+            self.assertEquals(metrics(copy), metrics(graph))
+            self.assertEquals(len(copy.eventGraph), len(graph.eventGraph))
+        parents, leftBonds, rightBonds, labels = self.g.toArrays()
+        leftBonds[0] = 1
+        self.assertRaises(RuntimeError, DNAHistoryGraph.fromArrays, parents, leftBonds, rightBonds, labels)
+        leftBonds[0] = -1
+        # Out of range indices, negative ones included
+        for value in (-2, len(parents)):
+            self.assertRaises(RuntimeError, DNAHistoryGraph.fromArrays, [value] + parents[1:], leftBonds, rightBonds, labels)
+        for value in (-2, 2 * len(parents)):
+            self.assertRaises(RuntimeError, DNAHistoryGraph.fromArrays, parents, [value] + leftBonds[1:], rightBonds, labels)
+            self.assertRaises(RuntimeError, DNAHistoryGraph.fromArrays, parents, leftBonds, rightBonds[:-1] + [value], labels)
+        # Thread ranks must come one per segment
+        threads = sorted(self.g.eventGraph, key=self.g.eventGraph.depth.get)
+        ranks = [threads.index(self.g.segmentThread(X)) for X in self.g.segments]
+        self.assertTrue(DNAHistoryGraph.fromArrays(parents, leftBonds, rightBonds, labels, ranks).validate())
+        for wrong in (ranks[:-1], ranks + [0]):
+            self.assertRaises(RuntimeError, DNAHistoryGraph.fromArrays, parents, leftBonds, rightBonds, labels, wrong)
+
+    def testIncrementalValidation(self):
+        # A graph is checked as a whole until its first validation
+        g = DNAHistoryGraph([ Segment("A"), Segment("C") ])
+        self.assertEquals(g.touched, set())
+        g.segments[0].parent = g.segments[1]
+        self.assertRaises(AssertionError, g.validate, STRUCTURE, True)
+        g.segments[0].parent = None
+        self.assertTrue(g.validate(STRUCTURE, True))
+        self.assertTrue(self.g.validate())
+        self.assertEquals(self.g.touched, set())
+        self.g.ambiguity()
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.g.setLabel(self.s3b, "G")
+        self.assertTrue(set([ self.s2, self.s2b, self.s3b ]) <= self.g.touched)
+        self.assertTrue(self.g.validate(FULL, incremental=True))
+        self.assertEquals(self.g.touched, set())
+        # Edits behind the back of the graph go unnoticed until the segment is touched
+        self.s4b.parent = self.s2b
+        self.assertTrue(self.g.validate(FULL, incremental=True))
+        self.assertRaises(AssertionError, self.g.validate, STRUCTURE)
+        self.g.setLabel(self.s4b, "C")
+        self.assertRaises(AssertionError, self.g.validate, STRUCTURE, True)
+
+    def testDot(self):
+        def dot(graph):
+            return "\n".join(["digraph G {" ] + [X.dot() for X in graph.eventGraph] + ["}"])
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.g.createBond(self.s4.left, self.s5b.left)
+        self.g.createBond(self.s5.left, self.s4b.left)
+        self.assertEquals(self.g.dot(), dot(self.g))
+        output = StringIO()
+        self.g.dot(output)
+        self.assertEquals(output.getvalue(), dot(self.g))
+        for graph in randomGraphs():
+            self.assertEquals(graph.dot(), dot(graph))
+
+    def testIndexedEventGraph(self):
+        self.assertEquals(self.g.eventGraph.index, None)
+        DNAHistoryGraph.indexedEventGraph = True
+        try:
+            for graph in randomGraphs():
+                indexed = DNAHistoryGraph.fromArrays(*graph.toArrays())
+                self.assertNotEquals(indexed.eventGraph.index, None)
+                self.assertNotEquals(copy.copy(indexed).eventGraph.index, None)
+                self.assertTrue(indexed.validate())
+                self.assertEquals(metrics(indexed), metrics(graph))
+        finally:
+            DNAHistoryGraph.indexedEventGraph = False
+
     def testAreSiblings(self):
         pass
     
@@ -103,13 +438,49 @@ class DNAHistoryGraphTest(unittest.TestCase):
         pass
     
     def testAmbiguity(self):
-        pass
+        def recomputed():
+            return sum(X.substitutionAmbiguity() for X in self.g.segments) + sum(X.rearrangementAmbiguity() for X in self.g.sides())
+        self.assertEquals(self.g.ambiguity(), 3)
+        self.g.setLabel(self.s3, "A")
+        self.assertEquals(self.g.ambiguity(), recomputed())
+        self.g.createBond(self.s2.left, self.s2b.left)
+        self.g.createBond(self.s4.left, self.s4b.left)
+        self.g.createBond(self.s5.left, self.s5b.left)
+        self.assertEquals(self.g.ambiguity(), recomputed())
+        self.g.deleteBranch(self.s1, self.s3)
+        self.g.deleteLabel(self.s2)
+        self.g.deleteBond(self.s4.left)
+        self.assertEquals(self.g.ambiguity(), recomputed())
+        self.assertTrue(self.g.validate())
     
     def testLowerBoundSubstitutionCost(self):
         self.assertEquals(self.g.lowerBoundSubstitutionCost(), 3)
     
     def testUpperBoundSubstitutionCost(self):
         self.assertEquals(self.g.upperBoundSubstitutionCost(), 6)
-        
+
+    def testCostBoundTracking(self):
+        def recomputed(graph):
+            # From scratch, independently of the tracked ModulePartition
+            modules = graph._computeModules()
+            return ([sum(X.lowerBoundSubstitutionCost() for X in graph.segments), sum(X.upperBoundSubstitutionCost() for X in graph.segments),
+                sum(X.lowerBoundRearrangementCost() for X in modules), sum(X.upperBoundRearrangementCost() for X in modules)],
+                set(frozenset(X.sides) for X in modules))
+        def tracked(graph):
+            return ([graph.lowerBoundSubstitutionCost(), graph.upperBoundSubstitutionCost(), graph.lowerBoundRearrangementCost(), graph.upperBoundRearrangementCost()],
+                set(frozenset(X.sides) for X in graph.modules()))
+        self.assertEquals(self.g.lowerBoundRearrangementCost(), 0)
+        mutations = [ lambda: self.g.createBond(self.s2.left, self.s2b.left),
+                lambda: self.g.createBond(self.s4.left, self.s5b.left),
+                lambda: self.g.createBond(self.s5.left, self.s4b.left),
+                lambda: self.g.setLabel(self.s3b, "T"),
+                lambda: self.g.deleteBond(self.s4.left),
+                lambda: self.g.createBond(self.s4.right, self.s5b.right),
+                lambda: self.g.deleteBranch(self.s3b, self.s5b) ]
+        for mutation in mutations:
+            mutation()
+            self.assertEquals(tracked(self.g), recomputed(self.g))
+        self.assertTrue(self.g.validate())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,10 +1,21 @@
 #!/usr/bin/env python
 
 class Label(object):
-	def __init__(self, segment, sequence):
-		self.segment = segment
-		self.sequence = str(sequence)[0]
-		assert self.sequence != "N"
+	""" Base of a segment, interned so that all segments with the same base share a single instance """
+	__slots__ = ('sequence',)
+	_interned = dict()
+
+	def __new__(cls, sequence):
+		if isinstance(sequence, Label):
+			return sequence
+		sequence = str(sequence)[0]
+		label = cls._interned.get(sequence)
+		if label is None:
+			assert sequence != "N"
+			label = super(Label, cls).__new__(cls)
+			label.sequence = sequence
+			cls._interned[sequence] = label
+		return label
 
 	def __str__(self):
 		return self.sequence
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+class LiftedBondIndex(object):
+	"""
+	Cache of the lifting ancestors, lifted bonds, attached descent flags and junction status of the sides of a graph, filled on demand.
+	Sides drop the entries which depend on their bond or parent just before and after changing them.
+	"""
+	def __init__(self):
+		self.clear()
+
+	def clear(self):
+		""" Drops all cached entries """
+		self.ancestors = dict()
+		self.liftedBondSets = dict()
+		self.attachedDescent = dict()
+		self.junctions = dict()
+
+	def invalidate(self, side):
+		""" Drops the entries which depend on the bond or the parent of side """
+		# Attached descent, junction status and lifted bonds of the side and its ancestors, up to the first bonded one
+		ancestor = side
+		while ancestor is not None:
+			self.attachedDescent.pop(ancestor, None)
+			self.junctions.pop(ancestor, None)
+			self.liftedBondSets.pop(ancestor, None)
+			if ancestor is not side and ancestor.bond is not None:
+				break
+			ancestor = ancestor.parent()
+		# Lifting ancestors of the descendants, down to the first bonded ones
+		self.ancestors.pop(side, None)
+		todo = [side]
+		while len(todo) > 0:
+			for child in todo.pop().children():
+				self.ancestors.pop(child, None)
+				if child.bond is None:
+					todo.append(child)
+
+	def ancestor(self, side):
+		""" Returns the closest bonded strict ancestor of side, or its root """
+		if side in self.ancestors:
+			return self.ancestors[side]
+		path = []
+		current = side
+		while current not in self.ancestors:
+			path.append(current)
+			parent = current.parent()
+			if parent is None:
+				ancestor = current
+				break
+			elif parent.bond is not None or parent.parent() is None:
+				ancestor = parent
+				break
+			current = parent
+		else:
+			ancestor = self.ancestors[current]
+		for X in path:
+			self.ancestors[X] = ancestor
+		return ancestor
+
+	def liftedBonds(self, side):
+		""" Returns the frozenset of bonded sides whose lifting ancestor is side, which must not be modified """
+		todo = [side]
+		while len(todo) > 0:
+			current = todo[-1]
+			if current in self.liftedBondSets:
+				todo.pop()
+				continue
+			children = current.children()
+			pending = [X for X in children if X.bond is None and X not in self.liftedBondSets]
+			if len(pending) > 0:
+				todo.extend(pending)
+				continue
+			if len(children) == 1 and children[0].bond is None:
+				# Unary unbonded chains share a single set
+				bonds = self.liftedBondSets[children[0]]
+			else:
+				bonds = set()
+				for child in children:
+					if child.bond is not None:
+						bonds.add(child)
+					else:
+						bonds |= self.liftedBondSets[child]
+				bonds = frozenset(bonds)
+			self.liftedBondSets[current] = bonds
+			todo.pop()
+		return self.liftedBondSets[side]
+
+	def hasAttachedDescent(self, side):
+		""" Returns True if side or one of its descendants is bonded """
+		todo = [side]
+		while len(todo) > 0:
+			current = todo[-1]
+			if current in self.attachedDescent:
+				todo.pop()
+			elif current.bond is not None:
+				self.attachedDescent[current] = True
+				todo.pop()
+			else:
+				children = current.children()
+				pending = [X for X in children if X not in self.attachedDescent]
+				if len(pending) > 0:
+					todo.extend(pending)
+				else:
+					self.attachedDescent[current] = any(self.attachedDescent[X] for X in children)
+					todo.pop()
+		return self.attachedDescent[side]
+
+	def isJunction(self, side):
+		""" Returns True if at least two children of side have attached descent """
+		if side not in self.junctions:
+			children = side.children()
+			self.junctions[side] = len(children) >= 2 and sum(self.hasAttachedDescent(X) for X in children) >= 2
+		return self.junctions[side]
+
+	def validate(self, sides=None):
+		""" Checks the cached entries of the given sides, or all of them by default """
+		if sides is None:
+			sides = set(self.ancestors) | set(self.liftedBondSets) | set(self.attachedDescent) | set(self.junctions)
+		assert all(self.ancestors[X] is X._computeAncestor() for X in sides if X in self.ancestors)
+		assert all(self.liftedBondSets[X] == X._computeLiftedBonds() for X in sides if X in self.liftedBondSets)
+		assert all(self.attachedDescent[X] == X._computeHasAttachedDescent() for X in sides if X in self.attachedDescent)
+		assert all(self.junctions[X] == X._computeIsJunction() for X in sides if X in self.junctions)
+		return True
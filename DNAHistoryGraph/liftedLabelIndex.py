@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+class LiftedLabelIndex(object):
+	"""
+	Cache of the lifting ancestors and lifted labels of the segments of a graph, filled on demand.
+	Segments drop the entries which depend on their label or parent just before and after changing them.
+	"""
+	def __init__(self):
+		self.ancestors = dict()
+		self.liftedLabelSets = dict()
+
+	def clear(self):
+		""" Drops all cached entries """
+		self.ancestors = dict()
+		self.liftedLabelSets = dict()
+
+	def invalidate(self, segment):
+		""" Drops the entries which depend on the label or the parent of segment """
+		# Lifted labels of the ancestors, up to the first labeled one
+		ancestor = segment.parent
+		while ancestor is not None:
+			self.liftedLabelSets.pop(ancestor, None)
+			if ancestor.label is not None:
+				break
+			ancestor = ancestor.parent
+		# Lifting ancestors of the descendants, down to the first labeled ones
+		self.ancestors.pop(segment, None)
+		todo = [segment]
+		while len(todo) > 0:
+			for child in todo.pop().children:
+				self.ancestors.pop(child, None)
+				if child.label is None:
+					todo.append(child)
+
+	def ancestor(self, segment):
+		""" Returns the closest labeled strict ancestor of segment, or its root """
+		if segment in self.ancestors:
+			return self.ancestors[segment]
+		path = []
+		current = segment
+		while current not in self.ancestors:
+			path.append(current)
+			parent = current.parent
+			if parent is None:
+				ancestor = current
+				break
+			elif parent.label is not None or parent.parent is None:
+				ancestor = parent
+				break
+			current = parent
+		else:
+			ancestor = self.ancestors[current]
+		for X in path:
+			self.ancestors[X] = ancestor
+		return ancestor
+
+	def liftedLabels(self, segment):
+		""" Returns the frozenset of labeled segments whose lifting ancestor is segment, which must not be modified """
+		todo = [segment]
+		while len(todo) > 0:
+			current = todo[-1]
+			if current in self.liftedLabelSets:
+				todo.pop()
+				continue
+			pending = [X for X in current.children if X.label is None and X not in self.liftedLabelSets]
+			if len(pending) > 0:
+				todo.extend(pending)
+				continue
+			children = list(current.children)
+			if len(children) == 1 and children[0].label is None:
+				# Unary unlabeled chains share a single set
+				labels = self.liftedLabelSets[children[0]]
+			else:
+				labels = set()
+				for child in children:
+					if child.label is not None:
+						labels.add(child)
+					else:
+						labels |= self.liftedLabelSets[child]
+				labels = frozenset(labels)
+			self.liftedLabelSets[current] = labels
+			todo.pop()
+		return self.liftedLabelSets[segment]
+
+	def validate(self, segments=None):
+		""" Checks the cached entries of the given segments, or all of them by default """
+		if segments is None:
+			segments = set(self.ancestors) | set(self.liftedLabelSets)
+		assert all(self.ancestors[X] is X._computeAncestor() for X in segments if X in self.ancestors)
+		assert all(self.liftedLabelSets[X] == X._computeLiftedLabels() for X in segments if X in self.liftedLabelSets)
+		return True
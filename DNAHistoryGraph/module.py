@@ -1,30 +1,75 @@
 #!/usr/bin/env python
 
 import math
-import operator
+
+def moduleLinks(side):
+	""" Returns the partners of a module side (its bond and the ancestors of its lifted partners), its number of free root partners and its number of non trivial lifted bonds """
+	partners = set()
+	if side.bond is not None:
+		partners.add(side.bond)
+	freeRoots = 0
+	liftedBonds = side.nonTrivialLiftedBonds()
+	for descendant in liftedBonds:
+		if descendant.bond != descendant.bond.ancestor():
+			partners.add(descendant.bond.ancestor())
+		else:
+			freeRoots += 1
+	return frozenset(partners), freeRoots, len(liftedBonds)
 
 class Module(object):
-	def __init__(self, side):
+	""" Connected set of module sides, with running counts from which the cost bounds are computed """
+	def __init__(self, side=None):
 		self.sides = set()
 		self.freeRootNumber = 0
-		def expandModule(side):
-			if side != None and side not in self.sides:
+		# Total number of non trivial lifted bonds, and numbers of sides with other than one, and more than one of them
+		self.liftedBondNumber = 0
+		self.nonUnitNumber = 0
+		self.complexNumber = 0
+		if side is not None:
+			self.expand(side)
+
+	def expand(self, side):
+		""" Adds all the module sides connected to side """
+		todo = [side]
+		while len(todo) > 0:
+			side = todo.pop()
+			if side not in self.sides:
 				assert side.isModuleMaterial()
-				self.sides.add(side)
-				expandModule(side.bond)
-				for descendant in side.nonTrivialLiftedBonds():
-					if descendant.bond != descendant.bond.ancestor():
-						expandModule(descendant.bond.ancestor())
-					else:
-						self.freeRootNumber += 1
-		expandModule(side)
+				links = moduleLinks(side)
+				self.add(side, links)
+				todo.extend(links[0])
+
+	def add(self, side, links):
+		self.sides.add(side)
+		self._count(links, 1)
+
+	def remove(self, side, links):
+		self.sides.remove(side)
+		self._count(links, -1)
+
+	def _count(self, links, sign):
+		partners, freeRoots, liftedBonds = links
+		self.freeRootNumber += sign * freeRoots
+		self.liftedBondNumber += sign * liftedBonds
+		self.nonUnitNumber += sign * (liftedBonds != 1)
+		self.complexNumber += sign * (liftedBonds > 1)
+
+	def merge(self, other):
+		""" Absorbs the sides and counts of another module """
+		self.sides |= other.sides
+		self.freeRootNumber += other.freeRootNumber
+		self.liftedBondNumber += other.liftedBondNumber
+		self.nonUnitNumber += other.nonUnitNumber
+		self.complexNumber += other.complexNumber
+
+	def __len__(self):
+		return len(self.sides)
 	
 	def lowerBoundRearrangementCost(self):
-		#print "calc", self.freeRootNumber, len(self.sides), math.ceil((self.freeRootNumber + len(self.sides))/2.0) - 1
 		return math.ceil((self.freeRootNumber + len(self.sides))/2.0) - 1
 	
 	def upperBoundRearrangementCost(self):
-		return (sum([ len(x.nonTrivialLiftedBonds()) for x in self.sides ]) + self.freeRootNumber)/2 - reduce(operator.mul, [ len(x.nonTrivialLiftedBonds()) == 1 for x in self.sides ], 1)
+		return (self.liftedBondNumber + self.freeRootNumber)/2 - (self.nonUnitNumber == 0)
 
 	def _liftedEdgeDot(self, liftedEdge):
 		sides = list(liftedEdge)
@@ -37,7 +82,7 @@ class Module(object):
 		return "\n".join(["node [color=blue]"] + map(lambda X: str(id(X.segment)), self.sides) + self._liftedEdgesDot() + ["node [color=black]"])
 
 	def isSimple(self):
-		return reduce(operator.mul, [ len(x.nonTrivialLiftedBonds()) <= 1 for x in self.sides ], 1) == 1
+		return self.complexNumber == 0
 
 	def validate(self, graph):
 		assert all(X.bond is not None or X.parent() is None for X in self.sides)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+from module import Module, moduleLinks
+from pyAVG.utils.disjointSet import DisjointSet
+
+class ModulePartition(object):
+	"""
+	Partition of the module sides of a graph into modules, kept in a disjoint set.
+	Links gained by a side only merge modules, a module is rebuilt from scratch when one of its sides loses a link, as it may split.
+	"""
+	def __init__(self):
+		self.sets = DisjointSet()
+		# Module of each representative, and links of each module side as returned by moduleLinks()
+		self.modules = dict()
+		self.links = dict()
+
+	def __iter__(self):
+		return self.modules.itervalues()
+
+	def __len__(self):
+		return len(self.modules)
+
+	def module(self, side):
+		""" Returns the module of a module side """
+		return self.modules[self.sets.find(side)]
+
+	def update(self, sides):
+		""" Refreshes the links of the given sides, and returns the set of modules retired or modified and the set of modules created or modified """
+		retired = set()
+		rebuilt = set()
+		joined = []
+		for side in set(sides):
+			old = self.links.pop(side, None)
+			new = None
+			if side.isModuleMaterial():
+				new = moduleLinks(side)
+				self.links[side] = new
+			if old is not None:
+				root = self.sets.find(side)
+				retired.add(self.modules[root])
+				if new is None or not old[0] <= new[0]:
+					rebuilt.add(root)
+				elif root not in rebuilt:
+					self.modules[root].remove(side, old)
+					self.modules[root].add(side, new)
+					joined.append(side)
+			elif new is not None:
+				self._singleton(side)
+				joined.append(side)
+
+		for root in rebuilt:
+			module = self.modules.pop(root)
+			self.sets.reset(module.sides)
+			for side in module.sides:
+				if side in self.links:
+					self._singleton(side)
+					joined.append(side)
+				else:
+					self.sets.remove(side)
+
+		for side in joined:
+			for partner in self.links[side][0]:
+				merged = self.sets.union(side, partner)
+				if merged is not None:
+					root, absorbed = merged
+					retired.add(self.modules[root])
+					retired.add(self.modules[absorbed])
+					self.modules[root].merge(self.modules.pop(absorbed))
+		return retired, set(self.module(X) for X in joined)
+
+	def _singleton(self, side):
+		self.sets.add(side)
+		module = Module()
+		module.add(side, self.links[side])
+		self.modules[side] = module
+
+	def validate(self, modules):
+		""" Checks the partition against modules built from scratch """
+		assert self.sets.validate()
+		assert set(self.links) == set(X for Y in modules for X in Y.sides)
+		assert len(self.modules) == len(modules)
+		for module in modules:
+			mine = self.module(iter(module.sides).next())
+			assert mine.sides == module.sides
+			assert (mine.freeRootNumber, mine.liftedBondNumber, mine.nonUnitNumber, mine.complexNumber) == (module.freeRootNumber, module.liftedBondNumber, module.nonUnitNumber, module.complexNumber)
+			assert all(self.links[X] == moduleLinks(X) for X in module.sides)
+		return True
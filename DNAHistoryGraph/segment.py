@@ -5,19 +5,28 @@ import thread
 from traversal import Traversal
 from label import Label
 from collections import Counter
+from cStringIO import StringIO
+from dotRenderer import DotRenderer
+
+# Shared by all childless segments, replaced by a set of their own on their first branch
+_noChildren = frozenset()
 
 class Segment(object):
 	""" DNA history segment """
+	__slots__ = ('graph', 'id', 'label', 'children', 'parent', 'left', 'right')
 
 	##########################
 	## Basics
 	##########################
 	def __init__(self, sequence=None, parent = None, children = []):
+		# Graph whose lifted label index caches the lineage of this segment, if any, and ID in its SegmentRegistry
+		self.graph = None
+		self.id = None
 		if sequence is not None:
-			self.label = Label(self, sequence)
+			self.label = Label(sequence)
 		else:
 			self.label = None
-		self.children = set()
+		self.children = _noChildren
 		for child in children:
 			self.createBranch(child)
 		self.parent = None
@@ -48,26 +57,49 @@ class Segment(object):
 		""" Returns list of segment sides """
 		return [self.left, self.right]
 	
+	def _invalidateLiftedLabels(self):
+		if self.graph is not None:
+			self.graph.liftedLabelIndex.invalidate(self)
+
+	def _invalidateLineage(self):
+		# Everything cached about the lineage of a segment and of its sides depends on its parent
+		if self.graph is not None:
+			self.graph.liftedLabelIndex.invalidate(self)
+			self.graph.liftedBondIndex.invalidate(self.left)
+			self.graph.liftedBondIndex.invalidate(self.right)
+
 	def createBranch(self, other):
 		""" Creates branch between segments """
 		assert other
+		other._invalidateLineage()
+		if self.children is _noChildren:
+			self.children = set()
 		self.children.add(other)
 		other.parent = self
+		other._invalidateLineage()
 
 	def deleteBranch(self, other):
 		""" Removes branch between segments """
+		other._invalidateLineage()
 		self.children.remove(other)
+		if len(self.children) == 0:
+			self.children = _noChildren
 		other.parent = None
+		other._invalidateLineage()
 		
 	def setLabel(self, sequence):
-		"""Safely set the label of a segment. #put in for future in which we move to storing lifted labels
+		"""Safely set the label of a segment, keeping the lifted label index up to date
 		"""
-		self.label = Label(self, sequence)
+		self._invalidateLiftedLabels()
+		self.label = Label(sequence)
+		self._invalidateLiftedLabels()
 		
 	def deleteLabel(self):
-		"""Safely delete the label of a segment. #put in for future in which we move to storing lifted labels
+		"""Safely delete the label of a segment, keeping the lifted label index up to date
 		"""
+		self._invalidateLiftedLabels()
 		self.label = None
+		self._invalidateLiftedLabels()
 
 	def getSide(self, left):
 		if left:
@@ -79,44 +111,63 @@ class Segment(object):
 		"""Destroy pointers to this segment """
 		self.left.deleteBond()
 		self.right.deleteBond()
-		for child in self.children:
+		children = list(self.children)
+		for segment in [self] + children:
+			segment._invalidateLineage()
+		for child in children:
 			child.parent = self.parent
 		if self.parent is not None:
 			self.parent.children |= self.children
 			self.parent.children.remove(self)
-		self.children = set()
+		self.children = _noChildren
 		self.parent = None
+		for segment in [self] + children:
+			segment._invalidateLineage()
 			
 	##########################
 	## Lifted labels
 	##########################
 
 	def _ancestor2(self):
-		if self.label is not None or self.parent is None:
-			return self
-		else:
-			return self.parent._ancestor2()
+		segment = self
+		while segment.label is None and segment.parent is not None:
+			segment = segment.parent
+		return segment
 
-	def ancestor(self):
+	def _computeAncestor(self):
 		if self.parent is None:
 			return self
 		else:
 			return self.parent._ancestor2()
 
-	def _liftedLabels2(self,):
-		if self.label is None:
-			return self.liftedLabels()
-		else:
-			return set([ self ])
+	def ancestor(self):
+		if self.graph is not None:
+			return self.graph.liftedLabelIndex.ancestor(self)
+		return self._computeAncestor()
+
+	def _computeLiftedLabels(self):
+		labels = set()
+		todo = list(self.children)
+		while len(todo) > 0:
+			segment = todo.pop()
+			if segment.label is not None:
+				labels.add(segment)
+			else:
+				todo.extend(segment.children)
+		return labels
+
+	def _liftedLabels(self):
+		# Read-only, possibly shared with the index
+		if self.graph is not None:
+			return self.graph.liftedLabelIndex.liftedLabels(self)
+		return self._computeLiftedLabels()
 	
 	def liftedLabels(self):
 		""" Returns set of labeled segments whose lifting ancestor is self"""
-		if len(self.children) == 0:
-			return set()
-		return set(reduce(lambda x, y : x | y, [x._liftedLabels2() for x in self.children]))
+		return set(self._liftedLabels())
 	
 	def nonTrivialLiftedLabels(self):
-		return set([ i for i in self.liftedLabels() if i.label != self.label ])
+		return set([ i for i in self._liftedLabels() if i.label != self.label ])
 
 	##########################
 	## Ambiguity
@@ -136,7 +187,7 @@ class Segment(object):
 	def isJunction(self):
 		if self.label == None:
 			return False
-		return len(self.liftedLabels()) > 1
+		return len(self._liftedLabels()) > 1
 
 	def isBridge(self):
 		if self.label == None:
@@ -167,44 +218,14 @@ class Segment(object):
 	def thread(self):
 		return thread.Thread([Traversal(self, True)])
 
-	def threads(self, data):
-		threads, segmentThreads = data
-		if self in segmentThreads:
-			return data
-		else:
-			thread = self.thread()
-			for traversal in thread:
-				segmentThreads[traversal.segment] = thread
-			threads.add(thread)
-
-			return threads, segmentThreads
-
 	##########################
 	## Output
 	##########################
 	def dot(self):
-		if self.label != None:
-			labelColour = { 'A':"greenyellow", 'C':'rosybrown', 'G':"powderblue", 'T':"plum" }[str(self.label)]
-		else:
-			labelColour = "white"
-		colour = "black"
-		if self.parent == None:
-			colour = "grey"
-		lines = ['%i [label="", style=filled, fillcolor=%s, width=0.25, height=0.25, color=%s, fixedsize=true]' % (id(self), labelColour, colour)]
-		if self.parent is not None:
-			if (self.label != None and self.ancestor().label == self.label) or (self.label == None and len(self.liftedLabels().intersection(self.ancestor().nonTrivialLiftedLabels())) == 0): 
-				lines.append('%i -> %i [color=green, weight=1000]' % (id(self.parent), id(self)))
-			else:
-				if self.parent.parent == None:
-					lines.append('%i -> %i [color=lightblue, weight=1000]' % (id(self.parent), id(self)))
-				else:
-					lines.append('%i -> %i [color=blue, weight=1000]' % (id(self.parent), id(self)))
-		lines.append(self.left.dot())
-		if self.left.bond is not self.right:
-			lines.append(self.right.dot())
-		return "\n".join(lines)	
-		
-	
+		output = StringIO()
+		DotRenderer(output).segment(self)
+		return output.getvalue()
+
 	##########################
 	## Validation
 	##########################
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+class SegmentRegistry(object):
+	"""
+	Segments of a graph, each carrying a dense integer ID which indexes its slot, so that other indexes can use flat arrays keyed by ID.
+	IDs freed by removals are reused, keeping them below the largest number of segments held at once.
+	Iteration and positional indexing (e.g. random.choice) go through a separate dense list, in constant time per segment:
+	appended segments come last and removing a segment moves the last one into its position, so the order is that of insertion
+	until the first removal, and is otherwise only changed by removals. restore() undoes the latest removal exactly, order included.
+	"""
+	def __init__(self, segments=[]):
+		self.slots = []
+		# Free IDs, the most recently freed last
+		self.free = []
+		# Segments in iteration order, and position of each one in it, indexed by ID
+		self.order = []
+		self.positions = []
+		for segment in segments:
+			self.append(segment)
+
+	def __len__(self):
+		return len(self.order)
+
+	def __iter__(self):
+		return iter(self.order)
+
+	def __contains__(self, segment):
+		return segment.id is not None and segment.id < len(self.slots) and self.slots[segment.id] is segment
+
+	def __getitem__(self, index):
+		""" Returns the segment at the given position of the iteration """
+		return self.order[index]
+
+	def capacity(self):
+		""" Returns the bound on IDs, i.e. the length of flat arrays keyed by them """
+		return len(self.slots)
+
+	def segment(self, id):
+		""" Returns the segment with the given ID """
+		return self.slots[id]
+
+	def position(self, segment):
+		""" Returns the position of a segment in the iteration """
+		return self.positions[segment.id]
+
+	def append(self, segment):
+		""" Registers a segment at the end of the iteration, giving it the most recently freed ID if any """
+		if len(self.free) > 0:
+			segment.id = self.free.pop()
+		else:
+			segment.id = len(self.slots)
+			self.slots.append(None)
+			self.positions.append(None)
+		self.slots[segment.id] = segment
+		self.positions[segment.id] = len(self.order)
+		self.order.append(segment)
+
+	def remove(self, segment):
+		""" Unregisters a segment, the last segment of the iteration taking its position """
+		assert segment in self
+		position = self.positions[segment.id]
+		last = self.order.pop()
+		if last is not segment:
+			self.order[position] = last
+			self.positions[last.id] = position
+		self.slots[segment.id] = None
+		self.positions[segment.id] = None
+		self.free.append(segment.id)
+		segment.id = None
+
+	def restore(self, segment, id, position):
+		""" Registers a segment again under the ID and at the position it was removed from, undoing the latest removal still in effect """
+		if self.free[-1] == id:
+			self.free.pop()
+		else:
+			self.free.remove(id)
+		assert self.slots[id] is None
+		self.slots[id] = segment
+		segment.id = id
+		self.positions[id] = position
+		if position < len(self.order):
+			# The segment which took the position goes back to the end
+			displaced = self.order[position]
+			self.positions[displaced.id] = len(self.order)
+			self.order.append(displaced)
+			self.order[position] = segment
+		else:
+			assert position == len(self.order)
+			self.order.append(segment)
+
+	def validate(self):
+		assert all(self.slots[X].id == X for X in range(len(self.slots)) if self.slots[X] is not None)
+		assert len(set(self.free)) == len(self.free)
+		assert all(self.slots[X] is None and self.positions[X] is None for X in self.free)
+		assert len(self) == sum(1 for X in self.slots if X is not None)
+		assert all(self.slots[X.id] is X and self.positions[X.id] == i for i, X in enumerate(self.order))
+		return True
@@ -1,4 +1,5 @@
 import unittest
+import sys
 from pyAVG.DNAHistoryGraph.segment import Segment
 from pyAVG.DNAHistoryGraph.label import Label
 
@@ -114,6 +115,17 @@ class SegmentTest(unittest.TestCase):
         self.assertEqual(self.s1.upperBoundSubstitutionCost(), 3)
         s7 = Segment("G", parent=self.s1)
         self.assertEqual(self.s1.upperBoundSubstitutionCost(), 4)
+
+    def testDeepLineage(self):
+        """Lineages deeper than the recursion limit are walked iteratively"""
+        chain = [ self.s4 ]
+        for i in range(sys.getrecursionlimit() + 100):
+            chain.append(Segment(parent=chain[-1]))
+        leaf = Segment("G", parent=chain[-1])
+        self.assertEqual(leaf.ancestor(), self.s4)
+        self.assertEqual(chain[-1].ancestor(), self.s4)
+        self.assertEqual(self.s4.liftedLabels(), set([ leaf ]))
+        self.assertEqual(self.s1.liftedLabels(), set([ self.s2, self.s4 ]))
     
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,8 +2,11 @@
 
 import module
 import liftedEdge
+from cStringIO import StringIO
+from dotRenderer import DotRenderer
 
 def _junctionsOnTheWay(side):
+	""" Returns True if an unattached junction lies strictly between side and its lifting ancestor """
 	ancestor = side.ancestor()
 	parent = side.parent()
 	while parent is not None and parent is not ancestor:
@@ -14,6 +17,7 @@ def _junctionsOnTheWay(side):
 
 class Side(object):
 	""" Segment side in DNA history graph """
+	__slots__ = ('segment', 'left', 'bond', 'opposite')
 
 	##############################
 	## Basics
@@ -35,14 +39,32 @@ class Side(object):
 	def __hash__(self):
 		return id(self)
 
+	@property
+	def id(self):
+		""" Dense ID derived from the ID of the segment, even for left sides and odd for right sides """
+		return 2 * self.segment.id + (not self.left)
+
+	def _invalidateLiftedBonds(self):
+		if self.segment.graph is not None:
+			self.segment.graph.liftedBondIndex.invalidate(self)
+
 	def createBond(self, other):
+		self._invalidateLiftedBonds()
+		other._invalidateLiftedBonds()
 		self.bond = other
 		other.bond = self
+		self._invalidateLiftedBonds()
+		other._invalidateLiftedBonds()
 
 	def deleteBond(self):
 		if self.bond is not None:
+			other = self.bond
+			self._invalidateLiftedBonds()
+			other._invalidateLiftedBonds()
 			self.bond.bond = None
 			self.bond = None
+			self._invalidateLiftedBonds()
+			other._invalidateLiftedBonds()
 
 	def parent(self):
 		if self.segment.parent is not None:
@@ -60,54 +82,74 @@ class Side(object):
 	##############################
 	## Lifted edges
 	##############################
+	def _computeHasAttachedDescent(self):
+		todo = [self]
+		while len(todo) > 0:
+			side = todo.pop()
+			if side.bond is not None:
+				return True
+			todo.extend(side.children())
+		return False
+
 	def _hasAttachedDescent(self):
-		if self.bond is not None:
-			return True
-		else:
-			return any(X._hasAttachedDescent() for X in self.children())
+		if self.segment.graph is not None:
+			return self.segment.graph.liftedBondIndex.hasAttachedDescent(self)
+		return self._computeHasAttachedDescent()
+
+	def _computeIsJunction(self):
+		return len(self.children()) >= 2 and sum(X._computeHasAttachedDescent() for X in self.children()) >= 2
 
 	def isJunction(self):
-		return len(self.children()) >= 2 and sum(X._hasAttachedDescent() for X in self.children()) >= 2
+		if self.segment.graph is not None:
+			return self.segment.graph.liftedBondIndex.isJunction(self)
+		return self._computeIsJunction()
 	
 	def isBridge(self):
 		return not (self.bond == None or self.parent() == None or self in self.ancestor().nonTrivialLiftedBonds() or\
 		 len(self.ancestor().nonTrivialLiftedBonds()) == 0 or len(self.nonTrivialLiftedBonds()) == 0)
 
 	def _ancestor2(self):
-		if self.bond is not None or self.parent() is None:
-			return self
-		else:
-			return self.parent()._ancestor2()
+		side = self
+		while side.bond is None and side.parent() is not None:
+			side = side.parent()
+		return side
 
-	def ancestor(self):
+	def _computeAncestor(self):
 		if self.parent() is None:
 			return self
 		else:
 			return self.parent()._ancestor2()
 
-	def _liftedBonds2(self,):
-		if self.bond is None:
-			return self.liftedBonds()
-		else:
-			return set([ self ])
+	def ancestor(self):
+		if self.segment.graph is not None:
+			return self.segment.graph.liftedBondIndex.ancestor(self)
+		return self._computeAncestor()
+
+	def _computeLiftedBonds(self):
+		bonds = set()
+		todo = self.children()
+		while len(todo) > 0:
+			side = todo.pop()
+			if side.bond is not None:
+				bonds.add(side)
+			else:
+				todo.extend(side.children())
+		return bonds
+
+	def _liftedBonds(self):
+		# Read-only, possibly shared with the index
+		if self.segment.graph is not None:
+			return self.segment.graph.liftedBondIndex.liftedBonds(self)
+		return self._computeLiftedBonds()
 	
 	def liftedBonds(self):
-		""" Returns set of labeled segments whose lifting ancestor is self"""
-		if len(self.children()) == 0:
-			return set()
-		return set(reduce(lambda x, y : x | y, [x._liftedBonds2() for x in self.children() ]))
+		""" Returns set of bonded sides whose lifting ancestor is self"""
+		return set(self._liftedBonds())
 	
 	def nonTrivialLiftedBonds(self):
 		""" Return list of non trivial lifted edge partners """
-		def fn(x):
-			#Returns True if no unattached junction on path to ancestor, else false.
-			if x.parent() == x.ancestor():
-				return False
-			if x.parent().bond == None and x.parent().isJunction():
-				return True
-			return fn(x.parent())
-		return set([ x for x in self.liftedBonds() if x.bond.ancestor() != self.bond 
-				or fn(x) or fn(x.bond) ])
+		return set([ x for x in self._liftedBonds() if x.bond.ancestor() != self.bond 
+				or _junctionsOnTheWay(x) or _junctionsOnTheWay(x.bond) ])
 
 	##############################
 	## Ambiguity
@@ -124,34 +166,16 @@ class Side(object):
 	##############################
 	
 	def isModuleMaterial(self):
-		return self.bond != None or (self.parent() == None and len(self.liftedBonds()) > 0)
+		return self.bond != None or (self.parent() == None and len(self._liftedBonds()) > 0)
 
 	##############################
 	## Output
 	##############################
 
 	def dot(self):
-		def fn(side):
-			if side.left:
-				return "normal"
-			return "inv"
-		l = []
-		if self.bond is not None: 
-			if self <= self.bond:
-				l.append("%i -> %i [color=red, dir=both, arrowtail=%s, arrowhead=%s]" % (id(self.segment), id(self.bond.segment), fn(self), fn(self.bond)))
-		
-		
-		if self.isModuleMaterial():
-			nonTrivialLiftedBonds = self.nonTrivialLiftedBonds()
-			for descendant in self.liftedBonds():
-				linkedAncestor = descendant.bond.ancestor()
-				colour = "cyan"
-				if descendant in nonTrivialLiftedBonds:
-					colour = "magenta"
-					if self < linkedAncestor:
-						l.append("%i -> %i [color=%s, dir=both, arrowtail=%s, arrowhead=%s, weight=0]" % (id(self.segment), id(linkedAncestor.segment), colour, fn(self), fn(linkedAncestor)))
-		
-		return "\n".join(l)
+		output = StringIO()
+		DotRenderer(output).side(self)
+		return output.getvalue()
 
 	##############################
 	## Validation
@@ -1,4 +1,5 @@
 import unittest
+import sys
 from pyAVG.DNAHistoryGraph.segment import Segment
 from pyAVG.DNAHistoryGraph.label import Label
 
@@ -99,5 +100,18 @@ class SideTest(unittest.TestCase):
         self.assertEqual(self.s3.rearrangementAmbiguity(), 1)
         self.assertEqual(self.s4.rearrangementAmbiguity(), 0)
 
+    def testDeepLineage(self):
+        """Lineages deeper than the recursion limit are walked iteratively"""
+        chain = [ self.s4 ]
+        for i in range(sys.getrecursionlimit() + 100):
+            chain.append(Segment(parent=chain[-1].segment).left)
+        leaf = Segment(parent=chain[-1].segment).left
+        self.assertEqual(leaf.ancestor(), self.s4)
+        self.assertFalse(self.s4.children()[0]._hasAttachedDescent())
+        leaf.createBond(self.s3B)
+        self.assertTrue(self.s4.children()[0]._hasAttachedDescent())
+        self.assertEqual(self.s4.liftedBonds(), set([ leaf ]))
+        self.assertEqual(self.s4.nonTrivialLiftedBonds(), set([ leaf ]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -3,6 +3,8 @@
 import segment
 import traversal
 import copy
+from cStringIO import StringIO
+from dotRenderer import DotRenderer
 
 class Thread(object):
 	""" Walk through DNA history graph, ie sequence of segment traversals """
@@ -43,9 +45,9 @@ class Thread(object):
 	################################
 
 	def dot(self):
-		ranks = " ".join(["{rank = same;"] + [str(id(X.segment)) for X in self.traversals] + ["}"])
-		data = "\n".join(X.dot() for X in self.traversals)
-		return "\n".join([ranks, data])
+		output = StringIO()
+		DotRenderer(output).thread(self)
+		return output.getvalue()
 
 	################################
 	## Operations
@@ -63,19 +65,25 @@ class Thread(object):
 
 	def _expandRight(self):
 		""" Expand a thread to its right, following as far as possible, stopping when a cycle is created """
-		if not self.isCycle():
+		while not self.isCycle():
 			next = self[-1].next()
-			if next is not None:
-				self.traversals.append(next)
-				self._expandRight()
+			if next is None:
+				break
+			self.traversals.append(next)
 			
 	def _expandLeft(self):
 		""" Expand a thread to its left, following bonds as far as possible, stopping when a cycle is created """
-		if not self.isCycle():
-			previous = self[0].previous()
-			if previous is not None:
-				self.traversals = [previous] + self.traversals
-				self._expandLeft()
+		# Collected backwards then prepended at once, as prepending one by one is quadratic
+		left = []
+		first = self[0]
+		while not self[-1].isConnected(first):
+			previous = first.previous()
+			if previous is None:
+				break
+			left.append(previous)
+			first = previous
+		left.reverse()
+		self.traversals = left + self.traversals
 
 	def _expand(self):
 		""" Expand a thread right then left, following bonds as far as possible, stopping when a cycle is created """
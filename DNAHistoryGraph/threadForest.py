@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+from thread import Thread
+from traversal import Traversal
+from pyAVG.utils.sequenceForest import SequenceForest
+
+class ForestThread(Thread):
+	""" Thread of a ThreadForest, whose traversals are only walked on demand, then cached until the forest changes the thread """
+	def __init__(self, forest):
+		self.forest = forest
+		# Any segment of the thread, maintained by the forest
+		self.segment = None
+		self._traversals = None
+
+	def __len__(self):
+		return self.forest.sequences.size(self.segment)
+
+	def __getitem__(self, key):
+		return self.traversals[key]
+
+	def __iter__(self):
+		return iter(self.traversals)
+
+	@property
+	def traversals(self):
+		""" The list of traversals of the thread, which must not be modified """
+		if self._traversals is None:
+			segments = self.segments()
+			first = segments[0]
+			orientation = len(segments) == 1 or (first.right.bond is not None and first.right.bond.segment is segments[1])
+			traversals = [Traversal(first, orientation)]
+			for i in range(1, len(segments)):
+				traversals.append(traversals[-1].next())
+			self._traversals = traversals
+		return self._traversals
+
+	def segments(self):
+		return self.forest.sequences.elements(self.segment)
+
+	def isCycle(self):
+		return self in self.forest.cycles
+
+class ThreadForest(object):
+	"""
+	Partition of the segments of a graph into threads, each stored as the sequence of its segments in a SequenceForest, tagged with its ForestThread.
+	Bonding and unbonding sides concatenate and split these sequences, so finding or updating the thread of a segment never walks the thread.
+	"""
+	def __init__(self, segments=[]):
+		self.sequences = SequenceForest()
+		# Threads whose last segment is bonded back to their first
+		self.cycles = set()
+		for segment in segments:
+			if segment not in self.sequences:
+				# A side bonded to itself makes a thread traverse its segments twice
+				walk = segment.thread()
+				seen = set()
+				elements = []
+				for traversal in walk:
+					if traversal.segment not in seen:
+						seen.add(traversal.segment)
+						elements.append(traversal.segment)
+				# Walks reflected by such sides at both ends close up without being cycles
+				self._addSequence(elements, ForestThread(self), walk.isCycle() and len(walk) == len(elements))
+
+	@staticmethod
+	def fromBonds(segments, bonds):
+		"""
+		Builds the forest of a list of segments given the flat list bonds of side partners, side 2i (resp. 2i+1) being the left (resp. right)
+		side of segments[i] and -1 meaning unbonded. Threads are walked as by segment.thread(), but over the list rather than through traversals.
+		"""
+		forest = ThreadForest()
+		seen = [False] * len(segments)
+		for i in range(len(segments)):
+			if not seen[i]:
+				# Traversals are given by their start sides, the end side of traversal X being X ^ 1
+				first = 2 * i
+				right = [first]
+				while bonds[right[-1] ^ 1] != first and bonds[right[-1] ^ 1] >= 0:
+					right.append(bonds[right[-1] ^ 1])
+				left = []
+				current = first
+				while bonds[right[-1] ^ 1] != current and bonds[current] >= 0:
+					current = bonds[current] ^ 1
+					left.append(current)
+				left.reverse()
+				walk = left + right
+				elements = []
+				for side in walk:
+					if not seen[side >> 1]:
+						seen[side >> 1] = True
+						elements.append(segments[side >> 1])
+				forest._addSequence(elements, ForestThread(forest), bonds[walk[-1] ^ 1] == walk[0] and len(walk) == len(elements))
+		return forest
+
+	def _addSequence(self, segments, thread, isCycle):
+		self.sequences.addSequence(segments)
+		self._tag(segments[0], thread)
+		if isCycle:
+			self.cycles.add(thread)
+
+	def _tag(self, segment, thread):
+		self.sequences.setTag(segment, thread)
+		thread.segment = segment
+		thread._traversals = None
+
+	def remappedCopy(self, segments, threads):
+		""" Returns a copy of the forest over the images segments[X] of its segments, and the mapping of the given threads to their copies """
+		forest = ThreadForest()
+		copies = dict()
+		for thread in threads:
+			copies[thread] = ForestThread(forest)
+			forest._addSequence([segments[X] for X in thread.segments()], copies[thread], thread in self.cycles)
+		return forest, copies
+
+	##################################
+	## Mapping
+	##################################
+	def __getitem__(self, segment):
+		return self.sequences.tag(segment)
+
+	def __contains__(self, segment):
+		return segment in self.sequences
+
+	def __len__(self):
+		return len(self.sequences)
+
+	def add(self, segment, thread=None):
+		""" Adds an unbonded segment in a thread of its own, which is created if not provided, and returns that thread """
+		if thread is None:
+			thread = ForestThread(self)
+		self.sequences.add(segment)
+		self._tag(segment, thread)
+		return thread
+
+	def pop(self, segment):
+		""" Removes a segment alone in its thread, and returns that thread """
+		thread = self[segment]
+		self.cycles.discard(thread)
+		self.sequences.remove(segment)
+		thread._traversals = None
+		return thread
+
+	__delitem__ = pop
+
+	##################################
+	## Bonds
+	##################################
+	def splits(self, sideA, sideB):
+		""" Returns True if deleting the bond between two sides splits their thread in two """
+		return sideA is not sideB and self[sideA.segment] not in self.cycles
+
+	def cutSizes(self, sideA, sideB):
+		""" Returns the lengths of the threads of sideA and sideB once the thread they share is split by deleting their bond """
+		indexA = self.sequences.index(sideA.segment)
+		indexB = self.sequences.index(sideB.segment)
+		size = self.sequences.size(sideA.segment)
+		if indexA < indexB:
+			return indexB, size - indexB
+		else:
+			return size - indexA, indexA
+
+	def link(self, sideA, sideB, thread):
+		""" Updates the threads for a bond between two sides, the resulting thread being tagged thread """
+		segmentA = sideA.segment
+		segmentB = sideB.segment
+		if sideA is sideB:
+			return
+		if self.sequences.sameSequence(segmentA, segmentB):
+			# Only the two ends of a linear thread can be bonded together
+			self.cycles.add(thread)
+		else:
+			if self.sequences.size(segmentA) > 1 and self.sequences.index(segmentA) == 0:
+				self.sequences.reverse(segmentA)
+			if self.sequences.size(segmentB) > 1 and self.sequences.index(segmentB) > 0:
+				self.sequences.reverse(segmentB)
+			self.sequences.concatenate(segmentA, segmentB)
+		self._tag(segmentA, thread)
+
+	def cut(self, sideA, sideB, threadA, threadB):
+		""" Updates the threads for the deletion of a bond between two sides, the resulting threads being tagged threadA and threadB """
+		segmentA = sideA.segment
+		segmentB = sideB.segment
+		if sideA is sideB:
+			return
+		indexA = self.sequences.index(segmentA)
+		indexB = self.sequences.index(segmentB)
+		thread = self[segmentA]
+		if thread in self.cycles:
+			assert threadA is threadB
+			self.cycles.remove(thread)
+			if abs(indexA - indexB) == 1 and self.sequences.size(segmentA) > 2:
+				# Rotating the cycle so that it starts after the deleted bond
+				if indexA < indexB:
+					self.sequences.split(segmentA, indexB)
+					self.sequences.concatenate(segmentB, segmentA)
+				else:
+					self.sequences.split(segmentA, indexA)
+					self.sequences.concatenate(segmentA, segmentB)
+		else:
+			self.sequences.split(segmentA, max(indexA, indexB))
+		self._tag(segmentA, threadA)
+		self._tag(segmentB, threadB)
+
+	##################################
+	## Validate
+	##################################
+	def validate(self):
+		assert self.sequences.validate()
+		segments = list(self.sequences.nodes)
+		threads = dict((self[X], X) for X in segments)
+		recomputed = ThreadForest(segments)
+		for thread, segment in threads.items():
+			assert thread.forest is self
+			elements = self.sequences.elements(segment)
+			assert thread.segment in elements
+			assert set(elements) == set(recomputed.sequences.elements(segment))
+			assert (thread in self.cycles) == (recomputed[segment] in recomputed.cycles)
+			for A, B in zip(elements[:-1], elements[1:]):
+				assert any(X.bond is not None and X.bond.segment is B for X in A.sides())
+		assert all(X in threads for X in self.cycles)
+		return True
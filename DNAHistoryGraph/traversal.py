@@ -10,7 +10,11 @@ class Traversal(object):
 	If the orientation is direct (i.e. True), the traversal starts on the left side of the segment and ends on the right.
 
 	If the orientation is opposite (i.e. False), the traversal starts on the right side of the segment and ends on the left.
+
+	Traversals are immutable values, which can be shared, compared and hashed.
 	"""
+	__slots__ = ('segment', 'orientation')
+
 	######################################
 	## Basics
 	######################################
@@ -25,6 +29,17 @@ class Traversal(object):
 	def __eq__(self, other):
 		return self.segment == other.segment and self.orientation == other.orientation
 
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash((self.segment, self.orientation))
+
+	@property
+	def id(self):
+		""" Dense ID of the traversal, i.e. the ID of its start side """
+		return self.start().id
+
 	######################################
 	## Output
 	######################################
@@ -76,8 +91,7 @@ class Traversal(object):
 
 	def createBranch(self, other):
 		""" Create branch from segment to segment of other traversal """
-		self.segment.children.add(other.segment)
-		other.segment.parent = self.segment
+		self.segment.createBranch(other.segment)
 
 	def sequence(self):
 		""" Returns sequence of segment, reverse complemented if the orientation is negative """
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import random
+from StringIO import StringIO
+
+from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph
+
+"""GFA import and export of DNA history graphs"""
+
+#########################################
+## Records
+#########################################
+# Segments are named after their IDs and written first, as S lines with their label or * if unlabeled.
+# A bond is an L line leaving its first side and entering its second: leaving segment X by its right side is X +, by its left side X -,
+# and entering segment Y by its left side is Y +, by its right side Y -.
+# A branch is a B line, which is not part of GFA 1 and is ignored by other tools, giving the parent then the child.
+BRANCH = "B"
+
+# Least number of fields of the records read
+_FIELD_NUMBERS = { "S":3, "L":5, BRANCH:3 }
+
+# Sequences of S lines, i.e. single bases or * if unlabeled, and orientations of L lines
+_SEQUENCES = frozenset(["A", "C", "G", "T", "*"])
+_ORIENTATIONS = frozenset(["+", "-"])
+
+def _exit(side):
+	if side.left:
+		return "-"
+	return "+"
+
+def _entry(side):
+	if side.left:
+		return "+"
+	return "-"
+
+#########################################
+## Export
+#########################################
+def writeGFA(graph, file):
+	""" Writes a graph to a file object one record at a time """
+	file.write("H\tVN:Z:1.0\n")
+	for segment in graph.segments:
+		if segment.label is None:
+			file.write("S\t%i\t*\n" % segment.id)
+		else:
+			file.write("S\t%i\t%s\n" % (segment.id, segment.label))
+	for segment in graph.segments:
+		for side in segment.sides():
+			# Each bond is written from its side with the lowest ID
+			if side.bond is not None and side.id <= side.bond.id:
+				file.write("L\t%i\t%s\t%i\t%s\t0M\n" % (segment.id, _exit(side), side.bond.segment.id, _entry(side.bond)))
+		if segment.parent is not None:
+			file.write("%s\t%i\t%i\n" % (BRANCH, segment.parent.id, segment.id))
+
+#########################################
+## Import
+#########################################
+def readGFA(file):
+	"""
+	Reads a graph from a file object one record at a time, ignoring headers, comments and other record types,
+	then builds its threads and event graph in bulk. Raises RuntimeError on malformed or inconsistent records, and on cyclic branches.
+	"""
+	# Segments are numbered in order of first mention, see DNAHistoryGraph.fromArrays()
+	names = dict()
+	labels = []
+	parents = []
+	bonds = []
+	defined = set()
+	def segment(name):
+		# Links and branches may come before the S line of their segments
+		if name not in names:
+			names[name] = len(labels)
+			labels.append(None)
+			parents.append(-1)
+			bonds.extend((-1, -1))
+		return names[name]
+
+	for lineNumber, line in enumerate(file, 1):
+		# Files written on Windows end their lines with \r\n
+		fields = line.rstrip("\r\n").split("\t")
+		if len(fields) < _FIELD_NUMBERS.get(fields[0], 0):
+			raise RuntimeError("Malformed GFA line", lineNumber)
+		if fields[0] == "S":
+			if fields[2] not in _SEQUENCES:
+				raise RuntimeError("Malformed GFA line", lineNumber)
+			if fields[1] in defined:
+				raise RuntimeError("Segment defined twice", fields[1])
+			defined.add(fields[1])
+			i = segment(fields[1])
+			if fields[2] != "*":
+				labels[i] = fields[2]
+		elif fields[0] == "L":
+			if fields[2] not in _ORIENTATIONS or fields[4] not in _ORIENTATIONS:
+				raise RuntimeError("Malformed GFA line", lineNumber)
+			# Leaving by the right side is +, entering by the left side is +
+			sideA = 2 * segment(fields[1]) + (fields[2] == "+")
+			sideB = 2 * segment(fields[3]) + (fields[4] != "+")
+			if bonds[sideA] != sideB:
+				if bonds[sideA] >= 0 or bonds[sideB] >= 0:
+					raise RuntimeError("Side bonded twice", lineNumber)
+				bonds[sideA] = sideB
+				bonds[sideB] = sideA
+		elif fields[0] == BRANCH:
+			child = segment(fields[2])
+			if parents[child] >= 0:
+				raise RuntimeError("Segment with two parents", fields[2])
+			parents[child] = segment(fields[1])
+
+	if len(defined) != len(labels):
+		raise RuntimeError("Records refer to undefined segments", [X for X in names if X not in defined])
+	return DNAHistoryGraph.fromArrays(parents, bonds[0::2], bonds[1::2], labels)
+
+#########################################
+## Unit test
+#########################################
+def test_main():
+	from pyAVG.inputs.simulator import RandomHistory
+	from pyAVG.process.deAVG import deAVG
+	for i in range(10):
+		graph = deAVG(RandomHistory(random.randint(2, 5), random.randint(2, 4)).avg())
+		output = StringIO()
+		writeGFA(graph, output)
+		copy = readGFA(StringIO(output.getvalue()))
+		assert copy.validate()
+		# Segments are read in the order they were written
+		mapping = dict(zip(graph.segments, copy.segments))
+		for segment in graph.segments:
+			image = mapping[segment]
+			assert str(image.label) == str(segment.label)
+			assert (image.parent is None and segment.parent is None) or image.parent is mapping[segment.parent]
+			for side, imageSide in zip(segment.sides(), image.sides()):
+				if side.bond is None:
+					assert imageSide.bond is None
+				else:
+					assert imageSide.bond.segment is mapping[side.bond.segment] and imageSide.bond.left == side.bond.left
+		assert copy.ambiguity() == graph.ambiguity()
+		assert copy.lowerBoundRearrangementCost() == graph.lowerBoundRearrangementCost()
+		assert len(copy.eventGraph) == len(graph.eventGraph)
+		# Writing the copy gives the same records up to the naming of the segments
+		output2 = StringIO()
+		writeGFA(copy, output2)
+		assert readGFA(StringIO(output2.getvalue())).validate()
+		output3 = StringIO()
+		writeGFA(readGFA(StringIO(output2.getvalue())), output3)
+		assert output3.getvalue() == output2.getvalue()
+	# Windows line endings
+	output = StringIO()
+	writeGFA(graph, output)
+	copy = readGFA(StringIO(output.getvalue().replace("\n", "\r\n")))
+	assert [str(X.label) for X in copy.segments] == [str(X.label) for X in graph.segments]
+	assert copy.toArrays() == graph.toArrays()
+	# Truncated records, unknown bases and orientations, and cyclic branches
+	for records in ("S\t1\n", "S\t1\tA\nS\t2\tA\nL\t1\t+\t2\n", "S\t1\tA\nB\t1\n", "S\t1\tN\n", "S\t1\tAC\n", "S\t1\tA\nS\t2\tA\nL\t1\t+\t2\t?\n"):
+		try:
+			readGFA(StringIO(records))
+			assert False
+		except RuntimeError as e:
+			assert e.args[0] == "Malformed GFA line" and e.args[1] == records.count("\n")
+	for records in ("S\t1\tA\nS\t2\t*\nB\t1\t2\nB\t2\t1\n", "S\t1\tA\nB\t1\t1\n"):
+		try:
+			readGFA(StringIO(records))
+			assert False
+		except RuntimeError:
+			pass
+
+if __name__ == '__main__':
+	test_main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+import sys
+import os
+import mmap
+import struct
+import random
+import tempfile
+from array import array
+
+from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph
+
+"""Binary on-disk format of DNA history graphs"""
+
+MAGIC = "PAVG"
+VERSION = 1
+""" Bumped whenever the layout below changes, files of other versions are refused """
+
+#########################################
+## Layout
+#########################################
+# Little endian throughout. After the header and the alphabet, with n segments numbered in the iteration order of the graph
+# and side 2i (resp. 2i+1) the left (resp. right) side of segment i, come the arrays:
+#	labels		n signed bytes, indices in the alphabet or -1 for unlabeled segments
+#	parents		n int32, -1 for roots
+#	bonds		2n int32, partner side of each side or -1
+#	threads		n int32, rank of the thread of each segment in the ordering of the event graph
+#	childStart	n+1 int32, segment i owning childIndex[childStart[i]:childStart[i+1]]
+#	childIndex	int32, children of the segments
+_HEADER = struct.Struct("<4sIIIII")
+""" Magic, version, number of segments, number of threads, number of branches, length of the alphabet """
+
+def _int32(values):
+	values = array('i', values)
+	assert values.itemsize == 4
+	return values
+
+def _dump(values, file):
+	if sys.byteorder != "little":
+		values = array(values.typecode, values)
+		values.byteswap()
+	values.tofile(file)
+
+def _load(typecode, data):
+	values = array(typecode)
+	values.fromstring(data)
+	if sys.byteorder != "little":
+		values.byteswap()
+	return values
+
+#########################################
+## Writing
+#########################################
+def writeGraph(graph, fileName):
+	""" Saves a graph, in time linear in its size """
+	segments = list(graph.segments)
+	parents, leftBonds, rightBonds, labelStrings = graph.toArrays()
+	alphabet = ""
+	labels = array('b', [-1] * len(segments))
+	for i, label in enumerate(labelStrings):
+		if label is not None:
+			code = alphabet.find(label)
+			if code < 0:
+				code = len(alphabet)
+				alphabet += label
+			labels[i] = code
+	bonds = _int32(X for pair in zip(leftBonds, rightBonds) for X in pair)
+	ranks = dict((X, i) for i, X in enumerate(sorted(graph.eventGraph, key=lambda X: graph.eventGraph.depth[X])))
+	threads = _int32(ranks[graph.segmentThreads[X]] for X in segments)
+	# Children grouped by parent in compressed sparse rows, each group in increasing order
+	childStart = _int32([0] * (len(segments) + 1))
+	for parent in parents:
+		if parent >= 0:
+			childStart[parent + 1] += 1
+	for i in range(len(segments)):
+		childStart[i + 1] += childStart[i]
+	childIndex = _int32([0] * childStart[len(segments)])
+	fill = _int32(childStart[:len(segments)])
+	for i, parent in enumerate(parents):
+		if parent >= 0:
+			childIndex[fill[parent]] = i
+			fill[parent] += 1
+	parents = _int32(parents)
+
+	file = open(fileName, 'wb')
+	file.write(_HEADER.pack(MAGIC, VERSION, len(segments), len(ranks), len(childIndex), len(alphabet)))
+	file.write(alphabet)
+	labels.tofile(file)
+	for values in (parents, bonds, threads, childStart, childIndex):
+		_dump(values, file)
+	file.close()
+
+#########################################
+## Reading
+#########################################
+class MappedGraph(object):
+	"""
+	Graph file mapped in memory, which serves read-only queries on segments and sides, numbered as in the file, straight from the mapped arrays.
+	Use graph() to materialize it as a DNAHistoryGraph.
+	"""
+	def __init__(self, fileName):
+		self.file = open(fileName, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		if len(self.map) < _HEADER.size:
+			raise RuntimeError("Truncated graph file", fileName)
+		magic, version, self.size, self.threadNumber, branchNumber, alphabetLength = _HEADER.unpack_from(self.map, 0)
+		if magic != MAGIC:
+			raise RuntimeError("Not a graph file", fileName)
+		if version != VERSION:
+			raise RuntimeError("Unsupported graph file version", version)
+		self.alphabet = self.map[_HEADER.size:_HEADER.size + alphabetLength]
+		# Offsets of the arrays
+		self.labelStart = _HEADER.size + alphabetLength
+		self.parentStart = self.labelStart + self.size
+		self.bondStart = self.parentStart + 4 * self.size
+		self.threadStart = self.bondStart + 8 * self.size
+		self.childStartStart = self.threadStart + 4 * self.size
+		self.childIndexStart = self.childStartStart + 4 * (self.size + 1)
+		if len(self.map) != self.childIndexStart + 4 * branchNumber:
+			raise RuntimeError("Truncated graph file", fileName)
+
+	def close(self):
+		self.map.close()
+		self.file.close()
+
+	def __len__(self):
+		return self.size
+
+	def _int(self, start, i):
+		return struct.unpack_from("<i", self.map, start + 4 * i)[0]
+
+	##################################
+	## Queries
+	##################################
+	def label(self, i):
+		""" Returns the label of segment i, None if unlabeled """
+		code = struct.unpack_from("b", self.map, self.labelStart + i)[0]
+		if code < 0:
+			return None
+		return self.alphabet[code]
+
+	def parent(self, i):
+		""" Returns the parent of segment i, -1 if it is a root """
+		return self._int(self.parentStart, i)
+
+	def children(self, i):
+		start = self._int(self.childStartStart, i)
+		end = self._int(self.childStartStart, i + 1)
+		return list(struct.unpack_from("<%ii" % (end - start), self.map, self.childIndexStart + 4 * start))
+
+	def bond(self, side):
+		""" Returns the partner of a side, -1 if unbonded """
+		return self._int(self.bondStart, side)
+
+	def thread(self, i):
+		""" Returns the rank of the thread of segment i in the ordering of the event graph """
+		return self._int(self.threadStart, i)
+
+	def ancestor(self, i):
+		""" Returns the closest labeled strict ancestor of segment i, or its root """
+		parent = self.parent(i)
+		if parent < 0:
+			return i
+		while self.label(parent) is None and self.parent(parent) >= 0:
+			parent = self.parent(parent)
+		return parent
+
+	##################################
+	## Materialization
+	##################################
+	def _array(self, typecode, start, length):
+		return _load(typecode, self.map[start:start + 4 * length])
+
+	def graph(self):
+		""" Builds the DNAHistoryGraph, whose segments have the IDs of the file, in time linear in its size """
+		labels = _load('b', self.map[self.labelStart:self.parentStart])
+		parents = self._array('i', self.parentStart, self.size)
+		bonds = self._array('i', self.bondStart, 2 * self.size)
+		threads = self._array('i', self.threadStart, self.size)
+		labels = [None if X < 0 else self.alphabet[X] for X in labels]
+		# The saved thread ranks spare the ordering of the event graph
+		return DNAHistoryGraph.fromArrays(parents, bonds[0::2], bonds[1::2], labels, threads)
+
+def readGraph(fileName):
+	""" Loads a graph saved by writeGraph() """
+	mapped = MappedGraph(fileName)
+	graph = mapped.graph()
+	mapped.close()
+	return graph
+
+#########################################
+## Unit test
+#########################################
+def test_main():
+	from pyAVG.inputs.simulator import RandomHistory
+	from pyAVG.process.deAVG import deAVG
+	handle, fileName = tempfile.mkstemp()
+	os.close(handle)
+	try:
+		for i in range(10):
+			graph = deAVG(RandomHistory(random.randint(2, 5), random.randint(2, 4)).avg())
+			segments = list(graph.segments)
+			writeGraph(graph, fileName)
+			mapped = MappedGraph(fileName)
+			assert len(mapped) == len(segments)
+			for j, segment in enumerate(segments):
+				assert mapped.label(j) == (None if segment.label is None else str(segment.label))
+				assert mapped.parent(j) == (-1 if segment.parent is None else segments.index(segment.parent))
+				assert sorted(mapped.children(j)) == sorted(segments.index(X) for X in segment.children)
+				assert segments[mapped.ancestor(j)] is segment.ancestor()
+				for k, side in enumerate(segment.sides()):
+					if side.bond is None:
+						assert mapped.bond(2 * j + k) == -1
+					else:
+						assert mapped.bond(2 * j + k) == 2 * segments.index(side.bond.segment) + (not side.bond.left)
+			for j in range(len(segments)):
+				for k in range(len(segments)):
+					assert (mapped.thread(j) == mapped.thread(k)) == (graph.segmentThreads[segments[j]] is graph.segmentThreads[segments[k]])
+					if segments[k].parent is segments[j] and mapped.thread(j) != mapped.thread(k):
+						assert mapped.thread(j) < mapped.thread(k)
+			copy = mapped.graph()
+			# The event graph is ordered as saved
+			for j in range(len(segments)):
+				assert copy.eventGraph.depth[copy.segmentThreads[copy.segments.segment(j)]] == mapped.thread(j)
+			arrays = copy.toArrays()
+			if mapped.threadNumber > 1:
+				try:
+					DNAHistoryGraph.fromArrays(*arrays, threadRanks=[0] * len(segments))
+					assert False
+				except RuntimeError:
+					pass
+			# Ranks which contradict the branches only cost a reordering
+			assert DNAHistoryGraph.fromArrays(*arrays, threadRanks=[mapped.threadNumber - 1 - mapped.thread(X) for X in range(len(segments))]).validate()
+			mapped.close()
+			assert copy.validate()
+			assert [X.id for X in copy.segments] == range(len(segments))
+			assert copy.ambiguity() == graph.ambiguity()
+			assert copy.lowerBoundRearrangementCost() == graph.lowerBoundRearrangementCost()
+			assert copy.upperBoundSubstitutionCost() == graph.upperBoundSubstitutionCost()
+			assert len(copy.eventGraph) == len(graph.eventGraph)
+	finally:
+		os.remove(fileName)
+
+if __name__ == '__main__':
+	test_main()
@@ -8,7 +8,6 @@ import copy
 from pyAVG.DNAHistoryGraph.evoHist import EvolutionaryHistory
 from pyAVG.DNAHistoryGraph.thread import CircularSequenceThread
 from pyAVG.DNAHistoryGraph.thread import CircularThread
-from pyAVG.DNAHistoryGraph.label import Label
 
 """Produces random evolutionary histories"""
 
@@ -24,25 +23,23 @@ class HistoryBranch(object):
 		self.child = None
 
 	def __str__(self):
-		if self.child is not None:
-			return "\n".join([self._label()] + [str(self.child)])
-		else:
-			return self._label()
+		return "\n".join(X._label() for X in self._lineage())
+
+	def _lineage(self):
+		""" Iterates through the branch and its descendants """
+		branch = self
+		while branch is not None:
+			yield branch
+			branch = branch.child
 
         #########################################
         ## Stats
         #########################################
 	def _cost(self):
-		if self.child is not None:
-			return self._operationCost() + self.child._cost() 
-		else:
-			return self._operationCost()
+		return sum(X._operationCost() for X in self._lineage())
 
 	def _subs(self):
-		if self.child is not None:
-			return self._substitutionCost() + self.child._subs() 
-		else:
-			return self._substitutionCost()
+		return sum(X._substitutionCost() for X in self._lineage())
 
         #########################################
         ## GraphViz representation
@@ -53,10 +50,7 @@ class HistoryBranch(object):
 
 	def _dot2(self):
 		""" GraphViz output """
-		if self.child is not None:
-			return "\n".join([self._dotString()] + [self.child._dot2()])
-		else:
-			return self._dotString()
+		return "\n".join(X._dotString() for X in self._lineage())
 
 	def _dotString(self):
 		""" GraphViz output """
@@ -110,11 +104,13 @@ class Operation(HistoryBranch):
 		self.genome = self._product(parent.genome)
 
 	def threads(self, parentThreads):
-		T = self.modifyThreads(map(lambda X: X.childThread(), parentThreads))
-		if self.child is not None:
-			return self.child.threads(T) + [T]
-		else:
-			return [T]
+		""" Returns the threads of the branch and its descendants, the deepest first """
+		threads = []
+		for branch in self._lineage():
+			parentThreads = branch.modifyThreads(map(lambda X: X.childThread(), parentThreads))
+			threads.append(parentThreads)
+		threads.reverse()
+		return threads
 
 class Mutation(Operation):
 	"""Substituion branch"""
@@ -152,7 +148,7 @@ class Mutation(Operation):
 
 	def modifyThreads(self, threads):
 		if self.chr is not None:
-			threads[self.chr][self.pos].segment.label = Label(threads[self.chr][self.pos].segment, threads[self.chr][self.pos].segment.label.complement())
+			threads[self.chr][self.pos].segment.setLabel(threads[self.chr][self.pos].segment.label.complement())
 		return threads
 
 class Duplication(Mutation):
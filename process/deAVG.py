@@ -16,7 +16,7 @@ def deAVG(avg, removalDensity=0.1, labelRemovalDensity=0.1, bondRemovalDensity=0
 			graph.segments.remove(segment)
 		else:
 			if random.random() < labelRemovalDensity or len(segment.liftedLabels()) > 0:
-				segment.label = None
+				segment.deleteLabel()
 			if random.random() < bondRemovalDensity or len(segment.left.liftedBonds()) > 0:
 				segment.left.deleteBond()
 			if random.random() < bondRemovalDensity or len(segment.right.liftedBonds()) > 0:
@@ -28,8 +28,7 @@ def deAVG(avg, removalDensity=0.1, labelRemovalDensity=0.1, bondRemovalDensity=0
 			graph.segments.remove(segment) 
 
 	# Recompute the event graph from scratch
-	graph.eventGraph, graph.segmentThreads = graph.threads()
-	graph.timeEventGraph()
+	graph.rebuildEventGraph()
 	return graph
 
 def test_main():
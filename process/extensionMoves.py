@@ -55,11 +55,11 @@ def applyCase1(args):
 		assert rootSegment.label != None
 		assert x.label != None
 		print 'Adding necessary bridge label'
-		graph.interpolateSegment(x).setLabel(str(rootSegment.label))
+		graph.setLabel(graph.interpolateSegment(x), str(rootSegment.label))
 	elif len(x.liftedLabels()) == 1:
 		print 'Adding necessary bridge label'
 		assert rootSegment.label != None
-		x.setLabel(str(rootSegment.label))
+		graph.setLabel(x, str(rootSegment.label))
 	else:
 		print 'Adding junction label'
 		assert len(x.liftedLabels()) > 1
@@ -68,7 +68,7 @@ def applyCase1(args):
 			l.add(rootSegment)
 		labelToAdd = random.choice(list(l)).label
 		assert labelToAdd != None
-		x.setLabel(str(labelToAdd))
+		graph.setLabel(x, str(labelToAdd))
 
 ###############################################
 ## Case 2
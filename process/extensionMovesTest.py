@@ -112,6 +112,22 @@ class ExtensionMovesTest(unittest.TestCase):
                     assert m.isSimple()
                     
             experiment += 1
+
+    def testRollback_random(self):
+        def signature(graph):
+            return [ (X, str(X.label), X.parent, sorted(X.children), X.left.bond, X.right.bond, graph.segmentThread(X)) for X in graph.segments ]
+        for experiment in range(5):
+            graph = deAVG(RandomHistory(3, 3).avg())
+            before = signature(graph)
+            ambiguity = graph.ambiguity()
+            graph.checkpoint()
+            while graph.ambiguity():
+                chosenExtension = random.choice(listCase1(graph) + listCase2(graph))
+                chosenExtension.function(chosenExtension.args)
+            graph.rollback()
+            assert graph.validate()
+            self.assertEquals(signature(graph), before)
+            self.assertEquals(graph.ambiguity(), ambiguity)
        
 
 if __name__ == '__main__':
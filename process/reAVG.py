@@ -1,11 +1,12 @@
 #!/usr/bin/env python
 
+import sys
 import random
 import time
 
 from pyAVG.inputs.simulator import RandomHistory
 from pyAVG.DNAHistoryGraph.extension import GraphExtension
-from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph
+from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph, FULL
 from deAVG import deAVG
 import extensionMoves
 
@@ -23,14 +24,15 @@ def reAVG(graph):
 	assert new.validate()
 	count = 0
 	while not new.isAVG():
+		# Only the segments touched by each step are checked again
 		tryExtension(new)
-		assert new.validate()
+		assert new.validate(FULL, incremental=True)
 		new.makeGBounded()
-		assert new.validate()
+		assert new.validate(FULL, incremental=True)
 		count += 1
 		if count > 1000:
 			# Poor man's infinite loop trap
-			print new.dot()
+			new.dot(sys.stdout)
 			assert False
 	return new 
 
@@ -2,6 +2,7 @@ import random
 import time
 import copy
 import os
+import shutil
 import subprocess
 
 from pyAVG.DNAHistoryGraph.graph import DNAHistoryGraph
@@ -34,6 +35,9 @@ def main():
     
     outputDir = "results"
     system("mkdir %s" % outputDir)
+    #Dot files are streamed to disk as the graphs are reported rather than kept in memory
+    dotDir = os.path.join(outputDir, "dots")
+    system("mkdir %s" % dotDir)
     
     while experiment < experimentNumber:
         #Create a random history
@@ -74,6 +78,14 @@ def main():
         def reportGraph(graph, graphName, iteration, step):
             graph = copy.copy(graph)
             graph.addFreeRoots()
+            #Only the history, G and the final G' graphs are ever plotted
+            dotFile = None
+            if graphName != "G'" or graph.ambiguity() == 0:
+                dotFile = os.path.join(dotDir, "%s.%s.dot" % (experiment, len(results)))
+                fH = open(dotFile, 'w')
+                graph.writeDot(fH)
+                fH.write("\n")
+                fH.close()
             return { "graphName":graphName, 
                             "experiment":experiment,
                             "iteration":iteration, 
@@ -84,7 +96,7 @@ def main():
                              "lbrc":int(graph.lowerBoundRearrangementCost()),
                              "ubsc":graph.upperBoundSubstitutionCost(),
                              "ubrc":int(graph.upperBoundRearrangementCost()),
-                             "dot":("%s\n" % graph.dot()) }
+                             "dotFile":dotFile }
         
         #Report the starting point
         results.append(reportGraph(avg, "H", "n/a", "n/a"))
@@ -96,7 +108,9 @@ def main():
         
         for iteration in range(iterationNumber):
             print "Starting iteration", iteration
-            graph = copy.copy(baseGraph)
+            #Extensions are applied to the base graph directly, then rolled back at the end of the iteration
+            graph = baseGraph
+            graph.checkpoint()
         
             #Undo the ambiguity
             #lBSC = graph.lowerBoundSubstitutionCost()
@@ -120,18 +134,19 @@ def main():
                 step += 1
             
             
-            #Report final AVG
-            for segment in list(graph.segments): #Get rid of useless nodes
+            #Report final AVG, cleaned up on a clone as the disconnections are not logged
+            finalGraph = copy.copy(graph)
+            graph.rollback()
+            for segment in list(finalGraph.segments): #Get rid of useless nodes
                 if segment.label == None and segment.left.bond == None and segment.right.bond == None:
                     segment.disconnect()
-                    graph.segments.remove(segment) 
+                    finalGraph.segments.remove(segment) 
         
             # Recompute the event graph from scratch
-            graph.eventGraph, graph.segmentThreads = graph.threads()
-            graph.timeEventGraph()
+            finalGraph.rebuildEventGraph()
             
             
-            results.append(reportGraph(graph, "G'", iteration, step))
+            results.append(reportGraph(finalGraph, "G'", iteration, step))
             #assert graph.validate()
             
             #assert graph.lowerBoundSubstitutionCost() == graph.upperBoundSubstitutionCost()
@@ -237,7 +252,10 @@ def main():
         def writeDot(fileName, row):
             fileName = os.path.join(dirName, fileName)
             fH = open(fileName, 'w')
-            fH.write("%s\n" % row["dot"])
+            dotFH = open(row["dotFile"])
+            shutil.copyfileobj(dotFH, fH)
+            dotFH.close()
+            fH.write("\n")
             fH.close()
             system("dot %s -Tpdf > %s.pdf" % (fileName, fileName))
         writeDot("history", historyRow)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+"""Measures the memory footprint of simulated DNA history graphs, in bytes per segment, to size jobs"""
+
+import sys
+import gc
+import types
+import random
+
+from pyAVG.inputs.simulator import RandomHistory
+
+# Shared by all instances, hence not part of the footprint of any graph
+_shared = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)
+
+def deepSize(root):
+	""" Returns the total size in bytes of the objects reachable from root, each counted once """
+	seen = set()
+	todo = [root]
+	total = 0
+	while len(todo) > 0:
+		obj = todo.pop()
+		if id(obj) in seen or isinstance(obj, _shared):
+			continue
+		seen.add(id(obj))
+		total += sys.getsizeof(obj)
+		todo.extend(gc.get_referents(obj))
+	return total
+
+def bytesPerSegment(graph):
+	return float(deepSize(graph)) / len(graph.segments)
+
+def main():
+	random.seed(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+	for length, depth in [(10, 5), (100, 5), (1000, 5)]:
+		graph = RandomHistory(length, depth).avg()
+		print "%d segments\t%.1f bytes per segment" % (len(graph.segments), bytesPerSegment(graph))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+
+import random
+from array import array
+from pyAVG.utils.partialOrderSet import PartialOrderSet
+from pyAVG.utils.reachabilityIndex import ReachabilityIndex
+
+"""Definition of Compact Partial Order Set"""
+
+class AdjacencyStore(object):
+	"""
+	Adjacency lists of dense integer IDs packed in a single array (CSR with slack).
+	Each ID owns a slot of the data array, which is moved to the end with doubled capacity when full.
+	The array is compacted when abandoned slots take more than half of it.
+	"""
+	def __init__(self):
+		self.data = array('l')
+		self.start = array('l')
+		self.length = array('l')
+		self.capacity = array('l')
+		self.garbage = 0
+
+	def __copy__(self):
+		new = AdjacencyStore()
+		new.data = array('l', self.data)
+		new.start = array('l', self.start)
+		new.length = array('l', self.length)
+		new.capacity = array('l', self.capacity)
+		new.garbage = self.garbage
+		return new
+
+	def reserve(self, ID):
+		""" Makes room for an ID """
+		while len(self.start) <= ID:
+			self.start.append(0)
+			self.length.append(0)
+			self.capacity.append(0)
+
+	def neighbours(self, ID):
+		start = self.start[ID]
+		return self.data[start:start + self.length[ID]]
+
+	def append(self, ID, other):
+		length = self.length[ID]
+		if length == self.capacity[ID]:
+			self._relocate(ID, max(2, 2 * length))
+		self.data[self.start[ID] + length] = other
+		self.length[ID] = length + 1
+
+	def remove(self, ID, other):
+		start = self.start[ID]
+		last = start + self.length[ID] - 1
+		for position in xrange(start, last + 1):
+			if self.data[position] == other:
+				self.data[position] = self.data[last]
+				self.length[ID] -= 1
+				return
+		raise KeyError(other)
+
+	def clear(self, ID):
+		self.garbage += self.capacity[ID]
+		self.start[ID] = 0
+		self.length[ID] = 0
+		self.capacity[ID] = 0
+
+	def _relocate(self, ID, capacity):
+		start = self.start[ID]
+		length = self.length[ID]
+		self.garbage += self.capacity[ID]
+		self.start[ID] = len(self.data)
+		self.capacity[ID] = capacity
+		self.data.extend(self.data[start:start + length])
+		self.data.extend(array('l', [0]) * (capacity - length))
+		if self.garbage > len(self.data) / 2:
+			self._compact()
+
+	def _compact(self):
+		data = array('l')
+		for ID in xrange(len(self.start)):
+			start = self.start[ID]
+			self.start[ID] = len(data)
+			data.extend(self.data[start:start + self.capacity[ID]])
+		self.data = data
+		self.garbage = 0
+
+class _Neighbours(object):
+	""" Set-like view of the neighbours of an element """
+	def __init__(self, poset, store, ID):
+		self.poset = poset
+		self.store = store
+		self.ID = ID
+
+	def __iter__(self):
+		elements = self.poset.elements
+		return (elements[X] for X in self.store.neighbours(self.ID))
+
+	def __len__(self):
+		return self.store.length[self.ID]
+
+	def __contains__(self, elem):
+		return elem in self.poset.ids and self.poset.ids[elem] in self.store.neighbours(self.ID)
+
+	def add(self, elem):
+		if elem not in self:
+			self.store.append(self.ID, self.poset.ids[elem])
+
+	def remove(self, elem):
+		self.store.remove(self.ID, self.poset.ids[elem])
+
+class _Adjacency(object):
+	""" Dict-like view of an adjacency store, mapping elements to the set-like views of their neighbours """
+	def __init__(self, poset, name):
+		self.poset = poset
+		self.name = name
+
+	def __getitem__(self, elem):
+		return _Neighbours(self.poset, getattr(self.poset, self.name), self.poset.ids[elem])
+
+	def __setitem__(self, elem, neighbours):
+		ID = self.poset.ids[elem]
+		store = getattr(self.poset, self.name)
+		store.reserve(ID)
+		store.clear(ID)
+		for X in neighbours:
+			store.append(ID, self.poset.ids[X])
+
+	def __delitem__(self, elem):
+		getattr(self.poset, self.name).clear(self.poset.ids[elem])
+
+	def __contains__(self, elem):
+		return elem in self.poset.ids
+
+	def __iter__(self):
+		return iter(self.poset.ids)
+
+	def __len__(self):
+		return len(self.poset.ids)
+
+class _Depths(object):
+	""" Dict-like view of the depth array """
+	def __init__(self, poset):
+		self.poset = poset
+
+	def __getitem__(self, elem):
+		return self.poset.depths[self.poset.ids[elem]]
+
+	def __setitem__(self, elem, depth):
+		self.poset.depths[self.poset.ids[elem]] = depth
+
+	def __delitem__(self, elem):
+		# The slot is released with the element ID
+		pass
+
+	def __contains__(self, elem):
+		return elem in self.poset.ids
+
+	def __iter__(self):
+		return iter(self.poset.ids)
+
+	def __len__(self):
+		return len(self.poset.ids)
+
+	def keys(self):
+		return self.poset.ids.keys()
+
+	def values(self):
+		return [self.poset.depths[X] for X in self.poset.ids.itervalues()]
+
+	def items(self):
+		return [(X, self.poset.depths[self.poset.ids[X]]) for X in self.poset.ids]
+
+class _Roots(object):
+	""" Set-like view of the root flags """
+	def __init__(self, poset):
+		self.poset = poset
+		self.count = 0
+
+	def __contains__(self, elem):
+		return elem in self.poset.ids and self.poset.rootFlags[self.poset.ids[elem]] == 1
+
+	def __iter__(self):
+		elements = self.poset.elements
+		flags = self.poset.rootFlags
+		return (elements[X] for X in xrange(len(flags)) if flags[X] == 1)
+
+	def __len__(self):
+		return self.count
+
+	def add(self, elem):
+		ID = self.poset.ids[elem]
+		if self.poset.rootFlags[ID] == 0:
+			self.poset.rootFlags[ID] = 1
+			self.count += 1
+
+	def remove(self, elem):
+		ID = self.poset.ids[elem]
+		if self.poset.rootFlags[ID] == 0:
+			raise KeyError(elem)
+		self.poset.rootFlags[ID] = 0
+		self.count -= 1
+
+class CompactPartialOrderSet(PartialOrderSet):
+	"""
+	Partially ordered set with the same interface as PartialOrderSet, which maps its elements to dense integer IDs
+	and keeps depths, root flags and adjacency lists in flat arrays indexed by these IDs rather than in per-element sets and dicts.
+	The parents, children, depth and roots attributes are views over these arrays.
+	"""
+
+	###################################
+	## Basics
+	###################################
+	def __init__(self, iter=[], indexed=False):
+		self.ids = dict()
+		self.elements = []
+		self.freeIDs = []
+		self.depths = array('l')
+		self.rootFlags = bytearray()
+		self.parentStore = AdjacencyStore()
+		self.childStore = AdjacencyStore()
+		super(CompactPartialOrderSet, self).__init__([], indexed)
+		self._makeViews()
+		if iter is not None:
+			for X in iter:
+				self.add(X)
+
+	def _makeViews(self):
+		self.roots = _Roots(self)
+		self.parents = _Adjacency(self, 'parentStore')
+		self.children = _Adjacency(self, 'childStore')
+		self.depth = _Depths(self)
+
+	def __copy__(self):
+		new = CompactPartialOrderSet(indexed=self.index is not None)
+		set.update(new, self)
+		new.ids = dict(self.ids)
+		new.elements = list(self.elements)
+		new.freeIDs = list(self.freeIDs)
+		new.depths = array('l', self.depths)
+		new.rootFlags = bytearray(self.rootFlags)
+		new.parentStore = self.parentStore.__copy__()
+		new.childStore = self.childStore.__copy__()
+		new.roots.count = self.roots.count
+		new.multiplicity = dict(self.multiplicity)
+		new.nextDepth = self.nextDepth
+		if new.index is not None:
+			new.index = ReachabilityIndex(new)
+			for X in new:
+				new.index.add(X)
+			new.index.clear()
+		return new
+
+	###################################
+	## Element IDs
+	###################################
+	def add(self, element):
+		"""Adds an unconstrained element to the set"""
+		if len(self.freeIDs) > 0:
+			ID = self.freeIDs.pop()
+			self.elements[ID] = element
+		else:
+			ID = len(self.elements)
+			self.elements.append(element)
+			self.depths.append(0)
+			self.rootFlags.append(0)
+		self.ids[element] = ID
+		super(CompactPartialOrderSet, self).add(element)
+
+	def remove(self, elem):
+		"""Removes element from a poset and all the incident constraints"""
+		super(CompactPartialOrderSet, self).remove(elem)
+		ID = self.ids.pop(elem)
+		self.elements[ID] = None
+		self.freeIDs.append(ID)
+
+	####################################################
+	## Reordering over the arrays
+	####################################################
+	def _dfsForward(self, x, upper):
+		""" Returns the set of IDs of descendants of x of depth lower than upper, or None as soon as an element of depth upper is reached """
+		store = self.childStore
+		depths = self.depths
+		ID = self.ids[x]
+		RForward = set([ID])
+		todo = [ID]
+		while len(todo) > 0:
+			ID = todo.pop()
+			start = store.start[ID]
+			for position in xrange(start, start + store.length[ID]):
+				y = store.data[position]
+				if depths[y] == upper:
+					return None
+				elif depths[y] < upper and y not in RForward:
+					RForward.add(y)
+					todo.append(y)
+		return RForward
+
+	def _dfsBackward(self, x, lower):
+		""" Returns the set of IDs of ancestors of x of depth greater than lower, or None as soon as an element of depth lower is reached """
+		store = self.parentStore
+		depths = self.depths
+		ID = self.ids[x]
+		RBackward = set([ID])
+		todo = [ID]
+		while len(todo) > 0:
+			ID = todo.pop()
+			start = store.start[ID]
+			for position in xrange(start, start + store.length[ID]):
+				y = store.data[position]
+				if depths[y] == lower:
+					return None
+				elif depths[y] > lower and y not in RBackward:
+					RBackward.add(y)
+					todo.append(y)
+		return RBackward
+
+	def _reassign(self, RForward, RBackward):
+		depths = self.depths
+		Lnodes = sorted(RBackward, key = depths.__getitem__) + sorted(RForward, key = depths.__getitem__)
+		Ldepths = sorted(depths[X] for X in Lnodes)
+		for ID, depth in zip(Lnodes, Ldepths):
+			if self.undoLog is not None:
+				self.undoLog.append(('depth', self.elements[ID], depths[ID]))
+			depths[ID] = depth
+
+###########################################
+## Unit test
+###########################################
+def _state(pos):
+	return (dict((X, pos.depth[X]) for X in pos), dict((X, set(pos.children[X])) for X in pos), set(pos.roots), dict(pos.multiplicity))
+
+def test_main():
+	for trial in range(50):
+		plain = PartialOrderSet(range(20))
+		compact = CompactPartialOrderSet(range(20), indexed=(trial % 2 == 0))
+		next = 20
+		compact.begin()
+		for i in range(300):
+			elems = sorted(plain)
+			A = random.choice(elems)
+			B = random.choice(elems)
+			choice = random.random()
+			if choice < 0.1:
+				plain.remove(A)
+				compact.remove(A)
+				plain.add(next)
+				compact.add(next)
+				A = next
+				next += 1
+			elif choice < 0.3 and len(plain.children[A]) > 0:
+				B = min(plain.children[A])
+				plain.removeConstraint(A, B)
+				compact.removeConstraint(A, B)
+			elif plain.testConstraint(A, B, True):
+				assert compact.testConstraint(A, B, True)
+				plain.addConstraint(A, B)
+				compact.addConstraint(A, B)
+			else:
+				assert not compact.testConstraint(A, B, True)
+			C = random.choice(sorted(plain))
+			assert plain.compare(A, C) == compact.compare(A, C)
+			if i == 150:
+				middle = _state(compact)
+				duplicate = compact.__copy__()
+				compact.begin()
+		assert compact.validate()
+		assert duplicate.validate()
+		assert _state(duplicate) == middle
+		compact.rollback()
+		assert compact.validate()
+		assert _state(compact) == middle
+		compact.rollback()
+		assert all(compact.depth[X] == X for X in range(20))
+
+if __name__ == "__main__":
+	test_main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import random
+
+"""Definition of Disjoint Set"""
+
+class DisjointSet(object):
+	"""Disjoint-set forest over hashable elements, with union by size and path compression"""
+
+	###################################
+	## Basics
+	###################################
+	def __init__(self, iter=[]):
+		self.parents = dict()
+		self.sizes = dict()
+		for X in iter:
+			self.add(X)
+
+	def __contains__(self, elem):
+		return elem in self.parents
+
+	def __len__(self):
+		return len(self.parents)
+
+	def add(self, elem):
+		"""Adds an element in a singleton set"""
+		self.parents[elem] = elem
+		self.sizes[elem] = 1
+
+	def reset(self, elems):
+		"""Breaks the sets of the given elements into singletons, which is only valid if elems covers these sets entirely"""
+		for X in elems:
+			self.add(X)
+
+	def remove(self, elem):
+		"""Removes an element, which must be a singleton"""
+		assert self.parents[elem] is elem and self.sizes[elem] == 1
+		del self.parents[elem]
+		del self.sizes[elem]
+
+	###################################
+	## Queries and merges
+	###################################
+	def find(self, elem):
+		"""Returns the representative of the set of elem"""
+		root = elem
+		while self.parents[root] is not root:
+			root = self.parents[root]
+		while elem is not root:
+			next = self.parents[elem]
+			self.parents[elem] = root
+			elem = next
+		return root
+
+	def union(self, elemA, elemB):
+		"""Merges the sets of two elements, returns the pair (kept representative, absorbed representative), or None if they were already merged"""
+		rootA = self.find(elemA)
+		rootB = self.find(elemB)
+		if rootA is rootB:
+			return None
+		if self.sizes[rootA] < self.sizes[rootB]:
+			rootA, rootB = rootB, rootA
+		self.parents[rootB] = rootA
+		self.sizes[rootA] += self.sizes.pop(rootB)
+		return rootA, rootB
+
+	def size(self, elem):
+		"""Returns the size of the set of elem"""
+		return self.sizes[self.find(elem)]
+
+	###################################
+	## Validate
+	###################################
+	def validate(self):
+		counts = dict()
+		for X in self.parents:
+			root = self.find(X)
+			counts[root] = counts.get(root, 0) + 1
+		assert counts == self.sizes
+		return True
+
+###########################################
+## Unit test
+###########################################
+def test_main():
+	for trial in range(20):
+		# Strings rather than small ints, as the set relies on identity
+		elems = [str(X) for X in range(50)]
+		sets = DisjointSet(elems)
+		naive = dict((X, set([X])) for X in elems)
+		for i in range(60):
+			A = random.choice(elems)
+			B = random.choice(elems)
+			merged = sets.union(A, B)
+			assert (merged is None) == (B in naive[A])
+			if merged is not None:
+				union = naive[A] | naive[B]
+				for X in union:
+					naive[X] = union
+			C = random.choice(elems)
+			assert (sets.find(A) is sets.find(C)) == (C in naive[A])
+			assert sets.size(C) == len(naive[C])
+		assert sets.validate()
+		component = list(naive[elems[0]])
+		sets.reset(component)
+		assert all(sets.size(X) == 1 for X in component)
+		assert sets.validate()
+
+if __name__ == "__main__":
+	test_main()
@@ -1,6 +1,8 @@
 #!/sur/bin/env python
 
 from exceptions import RuntimeError
+from contextlib import contextmanager
+from pyAVG.utils.reachabilityIndex import ReachabilityIndex
 
 """Definition of Partial Order Set"""
 
@@ -10,22 +12,53 @@ class PartialOrderSet(set):
 	###################################
 	## Basics
 	###################################
-	def __init__(self, iter=[]):
-		""" Creates an unconstrained Poset with the elements of iter (if provided) """
+	def __init__(self, iter=[], indexed=False):
+		""" Creates an unconstrained Poset with the elements of iter (if provided), optionally maintaining a reachability index """
 		super(PartialOrderSet, self).__init__(iter)
+		if indexed:
+			self.index = ReachabilityIndex(self)
+		else:
+			self.index = None
 		self.roots = set()
 		self.parents = dict()
 		self.children = dict()
 		self.depth = dict()
+		# Number of times each constraint was added, only stored when greater than 1
+		self.multiplicity = dict()
+		# Depths are sparse: removals leave holes, new elements are appended after the deepest label ever issued
+		self.nextDepth = 0
+		# List of inverse operations, only kept while a transaction is open
+		self.undoLog = None
+		self.checkpoints = []
 		if iter is not None:
 			map(lambda X: self.add(X), iter)
 	
 	def __copy__(self):
-		new = PartialOrderSet(self)
-		new.roots = copy.copy(self.roots)
-		new.parents = copy.copy(self.parents)
-		new.children = copy.copy(self.children)
-		self.depth = copy.copy(self.depth)
+		new = PartialOrderSet(self, indexed=self.index is not None)
+		new.roots = set(self.roots)
+		new.parents = dict((X, set(self.parents[X])) for X in self)
+		new.children = dict((X, set(self.children[X])) for X in self)
+		new.depth = dict(self.depth)
+		new.multiplicity = dict(self.multiplicity)
+		new.nextDepth = self.nextDepth
+		if new.index is not None:
+			new.index.clear()
+		return new
+
+	def remappedCopy(self, mapping):
+		""" Returns a poset of the same class over the images mapping[X] of the elements, with the same depths and constraints """
+		new = type(self)(indexed=self.index is not None)
+		for X in self:
+			new.add(mapping[X])
+			new.depth[mapping[X]] = self.depth[X]
+		# With an empty cache, the index has nothing to patch while the edges are replayed
+		if new.index is not None:
+			new.index.clear()
+		for X in self:
+			for Y in self.children[X]:
+				new._addEdge(mapping[X], mapping[Y])
+		new.multiplicity = dict(((mapping[X], mapping[Y]), count) for (X, Y), count in self.multiplicity.iteritems())
+		new.nextDepth = self.nextDepth
 		return new
 
 	###################################
@@ -37,37 +70,49 @@ class PartialOrderSet(set):
 		self.roots.add(element)
 		self.parents[element] = set()
 		self.children[element] = set()
-		self.depth[element] = len(self)
+		self.depth[element] = self.nextDepth
+		self.nextDepth += 1
+		if self.index is not None:
+			self.index.add(element)
+		if self.undoLog is not None:
+			self.undoLog.append(('add', element))
 
 	def _addEdge(self, ancestral, derived):
-		"""Adds an order constraint between two elements (low level)"""
+		"""Adds an order constraint between two elements, or increments its multiplicity if already present (low level)"""
 		if ancestral is None or derived is None:
 			return
 		else:
 			assert ancestral in self
 			assert derived in self
+			if self.undoLog is not None:
+				self.undoLog.append(('addEdge', ancestral, derived))
+			if ancestral in self.parents[derived]:
+				self.multiplicity[(ancestral, derived)] = self.constraintMultiplicity(ancestral, derived) + 1
+				return
 			if derived in self.roots:
 				self.roots.remove(derived)
 			self.parents[derived].add(ancestral)
 			self.children[ancestral].add(derived)
+			if self.index is not None:
+				self.index.addEdge(ancestral, derived)
 
 	###################################
 	## Removing an element
 	###################################
-	def _correctedDepth(self, elem, depth):
-		oldDepth = self.depth[elem]
-		if oldDepth <= depth:
-			return oldDepth
-		else:
-			return oldDepth - 1
-
 	def remove(self, elem):
 		"""Removes element from a poset and all the incident constraints"""
+		if self.undoLog is not None:
+			parents = dict((X, self.constraintMultiplicity(X, elem)) for X in self.parents[elem])
+			children = dict((X, self.constraintMultiplicity(elem, X)) for X in self.children[elem])
+			self.undoLog.append(('remove', elem, self.depth[elem], parents, children))
+		if self.index is not None:
+			self.index.remove(elem)
 		if elem in self.roots:
 			self.roots.remove(elem)
 
 		for parent in self.parents[elem]:
 			self.children[parent].remove(elem)
+			self.multiplicity.pop((parent, elem), None)
 		del self.parents[elem]
 
 		for child in self.children[elem]:
@@ -75,50 +120,55 @@ class PartialOrderSet(set):
 			assert elem is not child
 			assert elem in self.parents[child]
 			self.parents[child].remove(elem)
+			self.multiplicity.pop((elem, child), None)
+			if len(self.parents[child]) == 0:
+				self.roots.add(child)
 		del self.children[elem]
 
-		depth = self.depth[elem]
+		# Leaving a hole in the depth labels is harmless, the ordering of the remaining elements is unchanged
 		del self.depth[elem]
-		self.depth = dict((X, self._correctedDepth(X, depth)) for X in self.depth)
 		super(PartialOrderSet, self).remove(elem)
 	
 	####################################################
 	## Adding a constraint
 	####################################################
 	def _dfsForward(self, x, upper):
-		RForward = [x]
-		for y in self.children[x]:
-			if self.depth[y] == upper:
-				return None
-			elif y not in RForward and self.depth[y] < upper:
-				recursion = self._dfsForward(y, upper)
-				if recursion is None:
+		""" Returns the set of descendants of x of depth lower than upper, or None as soon as an element of depth upper is reached """
+		RForward = set([x])
+		todo = [x]
+		while len(todo) > 0:
+			for y in self.children[todo.pop()]:
+				depth = self.depth[y]
+				if depth == upper:
 					return None
-				else:
-					RForward += recursion
+				elif depth < upper and y not in RForward:
+					RForward.add(y)
+					todo.append(y)
 		return RForward
 
 	def _dfsBackward(self, x, lower):
-		RBackward = [x]
-		for y in self.parents[x]:
-			if self.depth[y] == lower:
-				return None
-			elif y not in RBackward and self.depth[y] > lower:
-				recursion = self._dfsBackward(y, lower)
-				if recursion is None:
+		""" Returns the set of ancestors of x of depth greater than lower, or None as soon as an element of depth lower is reached """
+		RBackward = set([x])
+		todo = [x]
+		while len(todo) > 0:
+			for y in self.parents[todo.pop()]:
+				depth = self.depth[y]
+				if depth == lower:
 					return None
-				else:
-					RBackward += recursion
+				elif depth > lower and y not in RBackward:
+					RBackward.add(y)
+					todo.append(y)
 		return RBackward
 	
 	def _sortF(self, vals):
-		# The use of set() to remove duplicates becomes crucial when interleaving the two lists in _reassign
-		return sorted(list(set(vals)), key = lambda X: self.depth[X])
+		return sorted(vals, key = lambda X: self.depth[X])
 
 	def _reassign(self, RForward, RBackward):
 		Lnodes = self._sortF(RBackward) + self._sortF(RForward)
 		Ldepths = sorted([self.depth[X] for X in Lnodes])
 		for index in range(len(Lnodes)):
+			if self.undoLog is not None:
+				self.undoLog.append(('depth', Lnodes[index], self.depth[Lnodes[index]]))
 			self.depth[Lnodes[index]] = Ldepths[index]
 
 	def testConstraint(self, ancestral, derived, strict=False):
@@ -127,7 +177,11 @@ class PartialOrderSet(set):
 		"""
 		if strict and ancestral == derived:
 			return False
-		return self.depth[derived] >= self.depth[ancestral] or self._dfsForward(derived, self.depth[ancestral]) is not None
+		if self.depth[derived] >= self.depth[ancestral]:
+			return True
+		if self.index is not None:
+			return not self.index.isAncestor(derived, ancestral)
+		return self._dfsForward(derived, self.depth[ancestral]) is not None
 
 	def addConstraint(self, ancestral, derived):
 		"""
@@ -155,44 +209,165 @@ class PartialOrderSet(set):
 			# No need to change anything
 			self._addEdge(ancestral, derived)
 
+	def _topologicalOrder(self):
+		indegree = dict((X, len(self.parents[X])) for X in self)
+		todo = [X for X in self if indegree[X] == 0]
+		order = []
+		while len(todo) > 0:
+			elem = todo.pop()
+			order.append(elem)
+			for child in self.children[elem]:
+				indegree[child] -= 1
+				if indegree[child] == 0:
+					todo.append(child)
+		return order, indegree
+
+	def _findCycle(self, indegree):
+		# Elements left with a positive indegree all have a parent in the same situation, so walking up must loop
+		elem = (X for X in self if indegree[X] > 0).next()
+		path = []
+		positions = dict()
+		while elem not in positions:
+			positions[elem] = len(path)
+			path.append(elem)
+			elem = (X for X in self.parents[elem] if indegree[X] > 0).next()
+		return list(reversed(path[positions[elem]:]))
+
+	def addConstraints(self, pairs):
+		"""
+		Adds many ordering constraints at once, then recomputes the ordering with a single topological sort,
+		unless all of them agree with the current ordering, which is then kept.
+		Refuses the whole batch and raises RuntimeError if a contradiction would be created, the offending cycle being given as second argument.
+		"""
+		# The index is rebuilt lazily afterwards rather than patched edge by edge
+		index = self.index
+		self.index = None
+		added = []
+		cycle = None
+		ordered = True
+		for ancestral, derived in pairs:
+			assert ancestral in self
+			assert derived in self
+			if ancestral is derived:
+				cycle = [ancestral]
+				break
+			if self.depth[ancestral] >= self.depth[derived]:
+				ordered = False
+			self._addEdge(ancestral, derived)
+			added.append((ancestral, derived))
+
+		if cycle is None and not ordered:
+			order, indegree = self._topologicalOrder()
+			if len(order) < len(self):
+				cycle = self._findCycle(indegree)
+			else:
+				if self.undoLog is not None:
+					self.undoLog.append(('depths', dict(self.depth), self.nextDepth))
+				for depth, elem in enumerate(order):
+					self.depth[elem] = depth
+				self.nextDepth = len(order)
+
+		if cycle is not None:
+			self._removeEdges(added)
+
+		self.index = index
+		if self.index is not None:
+			self.index.clear()
+		if cycle is not None:
+			raise RuntimeError("Constraints create a cycle", cycle)
+
 	################################################
 	## Removal of constraint
 	################################################
+	def constraintMultiplicity(self, parent, child):
+		"""Returns the number of times an ordering constraint was added and not removed"""
+		if parent not in self.parents[child]:
+			return 0
+		return self.multiplicity.get((parent, child), 1)
+
 	def removeConstraint(self, parent, child):
-		"""Removes an ordering constraint between two elements in the set"""
-		self.parents[child].remove(parent)
-		self.children[parent].remove(child)
-		if len(self.parents[child]) == 0:
-			self.roots.add(child)
+		"""Removes one instance of an ordering constraint between two elements in the set, the constraint only disappears with its last instance"""
+		count = self.constraintMultiplicity(parent, child)
+		if count > 2:
+			self.multiplicity[(parent, child)] = count - 1
+		elif count == 2:
+			del self.multiplicity[(parent, child)]
+		else:
+			# Raises KeyError, leaving the set untouched, if there is no such constraint
+			self.parents[child].remove(parent)
+			self.children[parent].remove(child)
+			if len(self.parents[child]) == 0:
+				self.roots.add(child)
+			if self.index is not None:
+				self.index.removeEdge(parent, child)
+		if self.undoLog is not None:
+			self.undoLog.append(('removeEdge', parent, child))
+
+	def _removeEdges(self, pairs):
+		for parent, child in pairs:
+			self.removeConstraint(parent, child)
 			
 	################################################
-	## Checking ancestry
+	## Transactions
 	################################################
-	def _ancestors(self, elem):
-		# Yes, I know, recursion would be nicer, but Python is shite with deep recursions
-		todo = [elem]
-		ancestors = list()
-		while len(todo) > 0:
-			elem = todo.pop()
-			if elem not in ancestors:
-				ancestors.extend(self.parents[elem])
-				todo.extend(self.parents[elem])
-		return ancestors
+	def begin(self):
+		""" Opens a (possibly nested) transaction, all subsequent changes can be undone by rollback() """
+		if self.undoLog is None:
+			self.undoLog = []
+		self.checkpoints.append(len(self.undoLog))
 
-	def _isAncestor(self, parent, child):
-		if self.depth[parent] >= self.depth[child]:
-			return False
-		else:
-			return parent in self._ancestors(child)
+	def commit(self):
+		""" Closes the innermost transaction, keeping its changes """
+		self.checkpoints.pop()
+		if len(self.checkpoints) == 0:
+			self.undoLog = None
 
-	def compare(self, elemA, elemB):
-		""" Return -1 if elemA is ancestor of elemB, return 1 is elemA is descendant of elemB else return 0 """
-		if self._isAncestor(elemA, elemB):
-			return -1
-		if self._isAncestor(elemB, elemA):
-			return 1
+	def _undo(self, entry):
+		if entry[0] == 'add':
+			self.remove(entry[1])
+		elif entry[0] == 'remove':
+			elem, depth, parents, children = entry[1:]
+			self.add(elem)
+			self.depth[elem] = depth
+			for parent in parents:
+				for count in range(parents[parent]):
+					self._addEdge(parent, elem)
+			for child in children:
+				for count in range(children[child]):
+					self._addEdge(elem, child)
+		elif entry[0] == 'addEdge':
+			self.removeConstraint(entry[1], entry[2])
+		elif entry[0] == 'removeEdge':
+			self._addEdge(entry[1], entry[2])
+		elif entry[0] == 'depth':
+			self.depth[entry[1]] = entry[2]
+		elif entry[0] == 'depths':
+			for elem in entry[1]:
+				self.depth[elem] = entry[1][elem]
+			self.nextDepth = entry[2]
 		else:
-			return 0
+			assert False, entry
+
+	def rollback(self):
+		""" Closes the innermost transaction, undoing its changes in time proportional to their number """
+		checkpoint = self.checkpoints.pop()
+		log = self.undoLog
+		self.undoLog = None
+		while len(log) > checkpoint:
+			self._undo(log.pop())
+		if len(self.checkpoints) > 0:
+			self.undoLog = log
+
+	@contextmanager
+	def transaction(self):
+		""" Context manager which commits on exit, or rolls back if an exception is raised """
+		self.begin()
+		try:
+			yield self
+		except:
+			self.rollback()
+			raise
+		self.commit()
 
 	################################################
 	## Checking ancestry
@@ -233,6 +408,11 @@ class PartialOrderSet(set):
 	def _validateRoots(self):
 		assert all(X in self for X in self.roots)
 		assert all(len(self.parents[X]) == 0 for X in self.roots)
+		assert all(X in self.roots for X in self if len(self.parents[X]) == 0)
+		return True
+
+	def _validateMultiplicity(self):
+		assert all(X[0] in self.parents[X[1]] and self.multiplicity[X] > 1 for X in self.multiplicity)
 		return True
 
 	def _validateDepth(self):
@@ -249,6 +429,8 @@ class PartialOrderSet(set):
 		assert self._validateParents()
 		assert self._validateDepth()
 		assert self._validateRoots()
+		assert self._validateMultiplicity()
+		assert self.index is None or self.index.validate()
 		return True
 
 	###########################################
@@ -267,6 +449,15 @@ class PartialOrderSet(set):
 ## Unit test
 ###########################################
 def test_main():
+	test_constraints()
+	test_deepChain()
+	test_transaction()
+	test_multiplicity()
+	test_rollbackDepths()
+	test_orderedBatch()
+	test_removeMissing()
+
+def test_constraints():
 	pos = PartialOrderSet()
 	pos.add(2)
 	pos.add(3)
@@ -286,8 +477,123 @@ def test_main():
 		assert pos.compare(3,2) == 1
 		assert pos.compare(1,1) == 0
 		assert pos.compare(2,5) == 0
-		return
+		# Removal leaves the relative ordering of the other elements untouched
+		pos.remove(2)
+		pos.add(6)
+		pos.addConstraint(6,1)
+		assert pos.validate()
+		assert pos.compare(6,3) == -1
+		assert pos.compare(1,3) == -1
+		assert pos.compare(3,5) == 0
+		# Batch insertion reorders everything at once, and refuses batches which close a cycle
+		pos.addConstraints([(5,6), (3,4)])
+		assert pos.validate()
+		assert pos.compare(5,3) == -1
+		try:
+			pos.addConstraints([(3,5), (4,5)])
+		except RuntimeError as e:
+			assert set(e.args[1]) in (set([1,3,4,5,6]), set([1,3,5,6]), set([1,4,5,6]))
+			assert pos.validate()
+			assert pos.compare(3,5) == 1
+			assert pos.compare(4,5) == 1
+			return
 	assert False
+
+def test_deepChain(length=100000):
+	pos = PartialOrderSet()
+	for i in range(length):
+		pos.add(i)
+	for i in range(1, length):
+		pos.addConstraint(i - 1, i)
+	# Forces a reordering of the whole chain, way deeper than the recursion limit
+	pos.add(-1)
+	pos.addConstraint(-1, 0)
+	assert pos.depth[-1] < pos.depth[0]
+	assert pos.compare(-1, length - 1) == -1
+	assert pos.testConstraint(length - 1, -1) == False
+
+def test_transaction():
+	for indexed in (False, True):
+		pos = PartialOrderSet(range(6), indexed=indexed)
+		pos.addConstraint(0, 1)
+		pos.addConstraint(1, 2)
+		state = lambda: (dict(pos.depth), dict((X, set(pos.parents[X])) for X in pos), set(pos.roots))
+		before = state()
+		pos.begin()
+		pos.addConstraint(5, 0)
+		pos.remove(1)
+		pos.add(6)
+		pos.addConstraint(6, 2)
+		pos.begin()
+		pos.addConstraints([(2, 3), (4, 5)])
+		pos.commit()
+		try:
+			with pos.transaction():
+				pos.removeConstraint(2, 3)
+				pos.addConstraint(3, 4)
+				pos.addConstraint(4, 6)
+		except RuntimeError:
+			assert 3 in pos.children[2]
+		assert pos.validate()
+		pos.rollback()
+		assert pos.validate()
+		assert state() == before
+		assert pos.compare(0, 2) == -1
+		assert pos.undoLog is None
+
+def test_multiplicity():
+	pos = PartialOrderSet(range(3))
+	pos.addConstraint(0, 1)
+	pos.addConstraints([(0, 1), (1, 2), (0, 1)])
+	assert pos.constraintMultiplicity(0, 1) == 3
+	pos.begin()
+	pos.remove(1)
+	pos.rollback()
+	assert pos.constraintMultiplicity(0, 1) == 3
+	pos.removeConstraint(0, 1)
+	pos.removeConstraint(0, 1)
+	assert pos.compare(0, 2) == -1
+	pos.removeConstraint(0, 1)
+	assert pos.compare(0, 2) == 0
+	assert pos.constraintMultiplicity(0, 1) == 0
+	assert pos.validate()
+
+def test_rollbackDepths():
+	# Depths handed out after a rolled back batch must not collide with those it restored
+	pos = PartialOrderSet(range(10))
+	for i in range(7):
+		pos.remove(i)
+	pos.begin()
+	pos.addConstraints([(7, 8)])
+	pos.rollback()
+	for i in range(20, 25):
+		pos.add(i)
+	assert len(set(pos.depth.values())) == len(pos)
+	assert pos.validate()
+
+def test_orderedBatch():
+	# A batch which agrees with the current ordering keeps it, others reorder
+	pos = PartialOrderSet(range(5))
+	depths = dict(pos.depth)
+	pos.addConstraints([(0, 1), (1, 3), (0, 1)])
+	assert pos.depth == depths
+	assert pos.constraintMultiplicity(0, 1) == 2
+	pos.addConstraints([(4, 0)])
+	assert pos.compare(4, 3) == -1
+	assert pos.validate()
 	
+def test_removeMissing():
+	# Removing a constraint which does not exist must not be undone by a rollback
+	pos = PartialOrderSet(range(3))
+	pos.begin()
+	try:
+		pos.removeConstraint(0, 1)
+		assert False
+	except KeyError:
+		pass
+	pos.rollback()
+	assert pos.constraintMultiplicity(0, 1) == 0
+	assert pos.validate()
+
 if __name__ == "__main__":
 	test_main()
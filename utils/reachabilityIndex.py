@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import random
+
+"""Definition of Reachability Index"""
+
+class ReachabilityIndex(object):
+	"""
+	Descendant bitsets over the elements of a poset, answering ancestry queries in constant time once cached.
+
+	Bitsets are computed lazily and kept under the invariant that whenever an element is cached, all its descendants are cached too.
+	Adding a constraint patches the cached ancestors in place, removing a constraint or an element drops the cached ancestors.
+	"""
+
+	###################################
+	## Basics
+	###################################
+	def __init__(self, poset):
+		self.poset = poset
+		self.masks = dict()
+		self.descendants = dict()
+		self.freeBits = []
+		self.nextBit = 0
+
+	def add(self, elem):
+		""" Assigns a bit to a new element """
+		if len(self.freeBits) > 0:
+			bit = self.freeBits.pop()
+		else:
+			bit = self.nextBit
+			self.nextBit += 1
+		self.masks[elem] = 1 << bit
+		self.descendants[elem] = 0
+
+	def remove(self, elem):
+		""" Releases the bit of an element, must be called while its constraints are still in the poset """
+		self._invalidate(elem)
+		mask = self.masks.pop(elem)
+		self.freeBits.append(mask.bit_length() - 1)
+
+	def clear(self):
+		""" Drops all cached bitsets """
+		self.descendants = dict()
+
+	###################################
+	## Updates
+	###################################
+	def _invalidate(self, elem):
+		# Cached elements only have cached descendants, so the walk can stop at the first uncached ancestor
+		todo = [elem]
+		while len(todo) > 0:
+			elem = todo.pop()
+			if elem in self.descendants:
+				del self.descendants[elem]
+				todo.extend(self.poset.parents[elem])
+
+	def addEdge(self, ancestral, derived):
+		""" Patches the cached ancestors of ancestral after the addition of a constraint """
+		if ancestral not in self.descendants:
+			return
+		if derived not in self.descendants:
+			self._invalidate(ancestral)
+			return
+		patch = self.masks[derived] | self.descendants[derived]
+		todo = [ancestral]
+		seen = set()
+		while len(todo) > 0:
+			elem = todo.pop()
+			if elem not in seen and elem in self.descendants:
+				seen.add(elem)
+				self.descendants[elem] |= patch
+				todo.extend(self.poset.parents[elem])
+
+	def removeEdge(self, ancestral, derived):
+		""" Drops the cached ancestors of ancestral after the removal of a constraint """
+		self._invalidate(ancestral)
+
+	###################################
+	## Queries
+	###################################
+	def _descendants(self, elem):
+		# Iterative post-order fill of the cache, to survive deep event graphs
+		todo = [elem]
+		while len(todo) > 0:
+			current = todo[-1]
+			if current in self.descendants:
+				todo.pop()
+				continue
+			children = self.poset.children[current]
+			pending = [X for X in children if X not in self.descendants]
+			if len(pending) > 0:
+				todo.extend(pending)
+			else:
+				bits = 0
+				for child in children:
+					bits |= self.masks[child] | self.descendants[child]
+				self.descendants[current] = bits
+				todo.pop()
+		return self.descendants[elem]
+
+	def isAncestor(self, ancestral, derived):
+		""" Returns True if derived is a strict descendant of ancestral """
+		if ancestral in self.descendants:
+			return self.descendants[ancestral] & self.masks[derived] != 0
+		return self._descendants(ancestral) & self.masks[derived] != 0
+
+	###################################
+	## Validate
+	###################################
+	def validate(self):
+		assert all(X in self.poset for X in self.masks)
+		assert len(self.masks) == len(self.poset)
+		for X in self.descendants:
+			assert all(Y in self.descendants for Y in self.poset.children[X])
+			expected = reduce(lambda A, B: A | B, [self.masks[Y] | self.descendants[Y] for Y in self.poset.children[X]], 0)
+			assert self.descendants[X] == expected
+		return True
+
+###########################################
+## Unit test
+###########################################
+def test_main():
+	from pyAVG.utils.partialOrderSet import PartialOrderSet
+	for trial in range(20):
+		plain = PartialOrderSet()
+		indexed = PartialOrderSet(indexed=True)
+		for i in range(30):
+			plain.add(i)
+			indexed.add(i)
+		for i in range(200):
+			A = random.randrange(30)
+			B = random.randrange(30)
+			if random.random() < 0.2 and len(plain.children[A]) > 0:
+				B = random.choice(list(plain.children[A]))
+				plain.removeConstraint(A, B)
+				indexed.removeConstraint(A, B)
+			elif plain.testConstraint(A, B, True):
+				assert indexed.testConstraint(A, B, True)
+				plain.addConstraint(A, B)
+				indexed.addConstraint(A, B)
+			else:
+				assert not indexed.testConstraint(A, B, True)
+			C = random.randrange(30)
+			assert plain.compare(A, C) == indexed.compare(A, C)
+		assert indexed.validate()
+
+if __name__ == "__main__":
+	test_main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+import random
+
+"""Definition of Sequence Forest"""
+
+# Source of treap priorities, kept apart from the global stream so that seeded simulations draw the same numbers with or without forests
+_priorities = random.Random()
+
+class _Node(object):
+	"""Treap node, the subtree below a flipped node is stored in reverse order"""
+	__slots__ = ('elem', 'priority', 'parent', 'left', 'right', 'size', 'flipped', 'tag')
+
+	def __init__(self, elem):
+		self.elem = elem
+		self.priority = _priorities.random()
+		self.parent = None
+		self.left = None
+		self.right = None
+		self.size = 1
+		self.flipped = False
+		# Only meaningful on roots
+		self.tag = None
+
+def _size(node):
+	if node is None:
+		return 0
+	else:
+		return node.size
+
+def _push(node):
+	"""Propagates a pending reversal to the children of node"""
+	if node.flipped:
+		node.left, node.right = node.right, node.left
+		if node.left is not None:
+			node.left.flipped = not node.left.flipped
+		if node.right is not None:
+			node.right.flipped = not node.right.flipped
+		node.flipped = False
+
+def _update(node):
+	node.size = 1 + _size(node.left) + _size(node.right)
+	if node.left is not None:
+		node.left.parent = node
+	if node.right is not None:
+		node.right.parent = node
+
+def _merge(nodeA, nodeB):
+	"""Returns the root of the concatenation of two treaps"""
+	if nodeA is None:
+		return nodeB
+	if nodeB is None:
+		return nodeA
+	if nodeA.priority > nodeB.priority:
+		_push(nodeA)
+		nodeA.right = _merge(nodeA.right, nodeB)
+		_update(nodeA)
+		return nodeA
+	else:
+		_push(nodeB)
+		nodeB.left = _merge(nodeA, nodeB.left)
+		_update(nodeB)
+		return nodeB
+
+def _split(node, index):
+	"""Returns the roots of the treaps of the first index elements and of the rest"""
+	if node is None:
+		return None, None
+	_push(node)
+	if _size(node.left) >= index:
+		left, right = _split(node.left, index)
+		node.left = right
+		_update(node)
+		return left, node
+	else:
+		left, right = _split(node.right, index - _size(node.left) - 1)
+		node.right = left
+		_update(node)
+		return node, right
+
+class SequenceForest(object):
+	"""
+	Disjoint sequences over hashable elements, each kept as a treap with parent pointers and lazy reversal,
+	so that concatenation, splitting, reversal, positions and root lookups take expected logarithmic time.
+	Each sequence carries a tag, which is kept by both halves of a split and by the first sequence of a concatenation.
+	"""
+
+	###################################
+	## Basics
+	###################################
+	def __init__(self, iter=[]):
+		self.nodes = dict()
+		for X in iter:
+			self.add(X)
+
+	def __contains__(self, elem):
+		return elem in self.nodes
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def add(self, elem, tag=None):
+		"""Adds an element as a singleton sequence"""
+		assert elem not in self.nodes
+		node = _Node(elem)
+		node.tag = tag
+		self.nodes[elem] = node
+
+	def addSequence(self, elems, tag=None):
+		"""Adds new elements as a single sequence, in linear time"""
+		# Cartesian tree construction, the stack holding the right spine of the treap built so far
+		spine = []
+		for elem in elems:
+			assert elem not in self.nodes
+			node = _Node(elem)
+			self.nodes[elem] = node
+			last = None
+			while len(spine) > 0 and spine[-1].priority < node.priority:
+				last = spine.pop()
+			node.left = last
+			if len(spine) > 0:
+				spine[-1].right = node
+			spine.append(node)
+		if len(spine) == 0:
+			return
+		# Sizes and parent pointers, children before parents
+		order = [spine[0]]
+		for node in order:
+			order.extend(X for X in (node.left, node.right) if X is not None)
+		for node in reversed(order):
+			_update(node)
+		spine[0].tag = tag
+
+	def remove(self, elem):
+		"""Removes an element, which must be alone in its sequence"""
+		node = self.nodes[elem]
+		assert node.parent is None and node.size == 1
+		del self.nodes[elem]
+
+	def _root(self, elem):
+		node = self.nodes[elem]
+		while node.parent is not None:
+			node = node.parent
+		return node
+
+	###################################
+	## Queries
+	###################################
+	def tag(self, elem):
+		"""Returns the tag of the sequence of elem"""
+		return self._root(elem).tag
+
+	def setTag(self, elem, tag):
+		self._root(elem).tag = tag
+
+	def size(self, elem):
+		"""Returns the length of the sequence of elem"""
+		return self._root(elem).size
+
+	def sameSequence(self, elemA, elemB):
+		return self._root(elemA) is self._root(elemB)
+
+	def index(self, elem):
+		"""Returns the position of elem in its sequence"""
+		node = self.nodes[elem]
+		path = [node]
+		while path[-1].parent is not None:
+			path.append(path[-1].parent)
+		for X in reversed(path):
+			_push(X)
+		index = _size(node.left)
+		while node.parent is not None:
+			if node is node.parent.right:
+				index += _size(node.parent.left) + 1
+			node = node.parent
+		return index
+
+	def elements(self, elem):
+		"""Returns the list of the elements of the sequence of elem, in order"""
+		elements = []
+		todo = []
+		node = self._root(elem)
+		while node is not None or len(todo) > 0:
+			if node is not None:
+				_push(node)
+				todo.append(node)
+				node = node.left
+			else:
+				node = todo.pop()
+				elements.append(node.elem)
+				node = node.right
+		return elements
+
+	###################################
+	## Edits
+	###################################
+	def reverse(self, elem):
+		"""Reverses the sequence of elem"""
+		root = self._root(elem)
+		root.flipped = not root.flipped
+
+	def concatenate(self, elemA, elemB):
+		"""Appends the sequence of elemB to the sequence of elemA, the result keeps the tag of the sequence of elemA"""
+		rootA = self._root(elemA)
+		rootB = self._root(elemB)
+		assert rootA is not rootB
+		tag = rootA.tag
+		rootA.tag = rootB.tag = None
+		root = _merge(rootA, rootB)
+		root.parent = None
+		root.tag = tag
+
+	def split(self, elem, index):
+		"""Splits the sequence of elem into its first index elements and the rest, both of which keep its tag"""
+		root = self._root(elem)
+		assert 0 < index < root.size
+		tag = root.tag
+		root.tag = None
+		left, right = _split(root, index)
+		left.parent = right.parent = None
+		left.tag = right.tag = tag
+
+	###################################
+	## Validate
+	###################################
+	def validate(self):
+		for elem, node in self.nodes.items():
+			assert node.elem is elem
+			assert node.size == 1 + _size(node.left) + _size(node.right)
+			for child in (node.left, node.right):
+				if child is not None:
+					assert child.parent is node
+					assert child.priority <= node.priority
+			if node.parent is not None:
+				assert node is node.parent.left or node is node.parent.right
+		return True
+
+###########################################
+## Unit test
+###########################################
+def test_main():
+	for trial in range(20):
+		# Strings rather than small ints, as the forest relies on identity
+		elems = [str(X) for X in range(40)]
+		forest = SequenceForest(elems)
+		naive = dict((X, [X]) for X in elems)
+		for X in elems:
+			forest.setTag(X, X)
+		for i in range(200):
+			A = random.choice(elems)
+			B = random.choice(elems)
+			if random.random() < 0.5:
+				if naive[A] is not naive[B]:
+					forest.concatenate(A, B)
+					sequence = naive[A] + naive[B]
+					for X in sequence:
+						naive[X] = sequence
+					assert forest.tag(B) == forest.tag(A)
+			elif random.random() < 0.5:
+				if len(naive[A]) > 1:
+					tag = forest.tag(A)
+					index = random.randint(1, len(naive[A]) - 1)
+					forest.split(A, index)
+					left, right = naive[A][:index], naive[A][index:]
+					for X in left:
+						naive[X] = left
+					for X in right:
+						naive[X] = right
+					assert forest.tag(left[0]) == forest.tag(right[0]) == tag
+			else:
+				forest.reverse(A)
+				sequence = naive[A][::-1]
+				for X in sequence:
+					naive[X] = sequence
+			assert forest.elements(A) == naive[A]
+			assert forest.size(B) == len(naive[B])
+			assert forest.index(B) == naive[B].index(B)
+			assert forest.sameSequence(A, B) == (naive[A] is naive[B])
+		assert forest.validate()
+		# Bulk construction
+		sequence = [str(X) for X in range(100, 100 + random.randint(0, 30))]
+		forest.addSequence(sequence, "bulk")
+		if len(sequence) > 0:
+			assert forest.elements(sequence[0]) == sequence
+			assert forest.tag(sequence[-1]) == "bulk"
+			assert forest.index(sequence[-1]) == len(sequence) - 1
+			elems.extend(sequence)
+		assert forest.validate()
+		# Breaking everything down to singletons
+		for X in elems:
+			while forest.size(X) > 1:
+				forest.split(X, 1)
+		for X in elems:
+			forest.remove(X)
+		assert len(forest) == 0
+		assert forest.validate()
+
+if __name__ == "__main__":
+	test_main()